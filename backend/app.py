@@ -3,8 +3,7 @@ from flask_cors import CORS
 from flask_mail import Mail
 from flask_jwt_extended import JWTManager
 from werkzeug.security import generate_password_hash
-from celery import Celery
-from database import db
+from database import db, get_database_url, get_engine_options
 from dotenv import load_dotenv
 import time
 import os
@@ -16,9 +15,12 @@ app = Flask(__name__, static_folder='../frontend', static_url_path='/static')
 
 # flask config
 app.config['SECRET_KEY'] = 'this-is-hms-web-app-123'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medihub-database.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# database config (sqlite file by default, postgres etc. via DATABASE_URL)
+app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
 # jwt config
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-key-456'
 app.config['JWT_TOKEN_LOCATION'] = ['headers']
@@ -34,12 +36,9 @@ app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('MAIL_USERNAME'))
 
-# celery config
-app.config['CELERY_BROKER_URL'] = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
-app.config['CELERY_RESULT_BACKEND'] = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
-app.config['CELERY_TASK_SERIALIZER'] = 'json'
-app.config['CELERY_ACCEPT_CONTENT'] = ['json']
-app.config['RESULT_SERIALIZER'] = 'json'
+# celery is configured from env in celery_tasks/config.py; settings put in
+# app.config['CELERY'] (e.g. task_always_eager) are applied on top
+app.config['CELERY'] = {}
 app.config['DEBUG'] = True
 
 # initialize extensions
@@ -48,21 +47,10 @@ CORS(app)
 mail = Mail(app)
 jwt = JWTManager(app)
 
-# celery setup
+# celery setup: the same app instance the workers use (tasks open the flask app context themselves)
 def make_celery(app):
-    celery = Celery(
-        app.import_name,
-        backend=app.config['CELERY_RESULT_BACKEND'],
-        broker=app.config['CELERY_BROKER_URL']
-    )
-    celery.conf.update(app.config)
-    
-    class ContextTask(celery.Task):
-        def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return self.run(*args, **kwargs)
-    
-    celery.Task = ContextTask
+    from celery_tasks import celery
+    celery.conf.update(app.config['CELERY'])
     return celery
 
 celery = make_celery(app)
@@ -70,6 +58,9 @@ celery = make_celery(app)
 # register blueprints
 from models import *
 from routes import *
+import counters  # registers the flush hook that keeps dashboard counters in step
+import search  # registers the flush hook that keeps the search index in step
+import autocomplete  # registers the hooks that keep typeahead suggestions in step
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
@@ -114,10 +105,24 @@ def serve_frontend(path):
     # otherwise serve index.html for client-side routing
     return send_from_directory('../frontend', 'index.html')
 
+# rebuild dashboard counters from scratch: flask --app app rebuild-counters
+@app.cli.command('rebuild-counters')
+def rebuild_counters_command():
+    count = counters.rebuild_counters()
+    print(f"Rebuilt {count} counters")
+
+# refill the doctor/patient search index: flask --app app rebuild-search
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    count = search.rebuild_search_index()
+    print(f"Indexed {count} doctors/patients")
+
 # database initialization
 def setup_db():
+    from migrations import migrate
+
     with app.app_context():
-        db.create_all()
+        migrate()
         
         # create admin if not exists
         admin = User.query.filter_by(role='admin').first()
@@ -132,6 +137,9 @@ def setup_db():
             db.session.commit()
             print("Admin created: admin/admin")
 
+        # typeahead index for this process; writes from any process reach it through the change log
+        autocomplete.autocomplete.rebuild()
+
 # application entry point
 if __name__ == '__main__':
     setup_db()
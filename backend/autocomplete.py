@@ -0,0 +1,334 @@
+import logging
+import os
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from flask import current_app
+from sqlalchemy import event, func, inspect, insert
+from sqlalchemy.orm import Session
+from database import db
+from models import Doctor, Patient, AutocompleteChange
+
+logger = logging.getLogger(__name__)
+
+# suggestions returned per kind when the client does not ask for a limit, and the cap
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', 10))
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+# multi-process deployments: each process pulls the change log every this many seconds in a background
+# thread and applies the rows other processes changed; 0 (single process) keeps no change log, local
+# writes are applied on commit anyway
+AUTOCOMPLETE_SYNC_SECONDS = float(os.getenv('AUTOCOMPLETE_SYNC_SECONDS', 0))
+# change log rows older than this are pruned; a process that has not synced for that long rebuilds
+CHANGE_RETENTION = timedelta(hours=1)
+PRUNE_SECONDS = 60
+# change ids below the last one seen that are read again, for rows committed out of id order
+CHANGE_OVERLAP = 100
+
+AUTOCOMPLETE_KINDS = ('doctors', 'specializations', 'patients')
+
+# lowercase, accents stripped, punctuation dropped: 'Dr. José Núñez' -> ['dr', 'jose', 'nunez']
+def _words(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return re.findall(r'\w+', value.lower())
+
+# one key per word start, so 'anita sharma' is found by 'ani' and by 'sha'
+def _keys_for(label):
+    words = _words(label)
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+# sorted array of (key, entry id) searched with bisect; a lookup is one binary search plus a scan
+# over the matches it returns, inserts/removals are one bisect and a list shift each
+class PrefixIndex:
+    def __init__(self, entries=None):
+        # entry id -> (label, payload)
+        self._entries = dict(entries or {})
+        self._keys = sorted(
+            (key, entry_id) for entry_id, (label, _) in self._entries.items() for key in _keys_for(label)
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, entry_id, label, payload=None):
+        self.remove(entry_id)
+        self._entries[entry_id] = (label, payload)
+        for key in _keys_for(label):
+            insort(self._keys, (key, entry_id))
+
+    def remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in _keys_for(entry[0]):
+            i = bisect_left(self._keys, (key, entry_id))
+            if i < len(self._keys) and self._keys[i] == (key, entry_id):
+                del self._keys[i]
+
+    # up to limit (entry id, label, payload) whose label has a word starting with prefix, in key order
+    def lookup(self, prefix, limit):
+        prefix = ' '.join(_words(prefix))
+        results = []
+        if not prefix:
+            return results
+        seen = set()
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and len(results) < limit:
+            key, entry_id = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            if entry_id not in seen:
+                seen.add(entry_id)
+                label, payload = self._entries[entry_id]
+                results.append((entry_id, label, payload))
+            i += 1
+        return results
+
+# in-process suggestions for active doctor names, their specializations and patient names
+class Autocomplete:
+    def __init__(self):
+        self._indexes = {kind: PrefixIndex() for kind in AUTOCOMPLETE_KINDS}
+        # active doctors as indexed: id -> (name, specialization); specializations are reference counted
+        self._doctors = {}
+        self._specializations = Counter()
+        self.built = False
+        # change log position: last id applied, ids applied inside the overlap window, time of the last pull
+        self._last_change_id = 0
+        self._applied = set()
+        self._synced_at = None
+        self._pruned_at = 0
+        self.rebuilds = 0
+        self.syncs = 0
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._thread_lock = Lock()
+        self._thread = None
+        self._pid = None
+
+    # start the sync thread of this process once (again after a fork, threads do not survive it)
+    def start(self, app):
+        if not AUTOCOMPLETE_SYNC_SECONDS:
+            return
+        with self._thread_lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = Thread(target=self._run, args=(app,), name='autocomplete-sync', daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.warning('autocomplete sync failed: %s', e)
+                finally:
+                    db.session.remove()
+            time.sleep(AUTOCOMPLETE_SYNC_SECONDS)
+
+    # load everything from the database; the new index is built aside and swapped in,
+    # lookups keep using the old one meanwhile
+    def rebuild(self):
+        # changes committed while loading are replayed by the next sync
+        last_change_id = db.session.query(func.max(AutocompleteChange.id)).scalar() or 0
+        doctors = {
+            doctor_id: (name, specialization)
+            for doctor_id, name, specialization in db.session.query(
+                Doctor.id, Doctor.name, Doctor.specialization
+            ).filter(Doctor.is_active == True).all()
+        }
+        patients = db.session.query(Patient.id, Patient.name).all()
+
+        specializations = Counter(spec for _, spec in doctors.values() if spec)
+        indexes = {
+            'doctors': PrefixIndex({
+                doctor_id: (name, {'specialization': spec}) for doctor_id, (name, spec) in doctors.items() if name
+            }),
+            'specializations': PrefixIndex({
+                spec.lower(): (spec, None) for spec in specializations
+            }),
+            'patients': PrefixIndex({patient_id: (name, None) for patient_id, name in patients if name})
+        }
+        with self._lock:
+            self._indexes = indexes
+            self._doctors = doctors
+            self._specializations = specializations
+            self._last_change_id = last_change_id
+            self._applied = set()
+            self._synced_at = time.time()
+            self.built = True
+            self.rebuilds += 1
+
+    # apply the change log rows written since the last pull (by any process), rebuild when
+    # this process has no index yet or was away longer than the log is kept
+    def sync(self):
+        if not self.built or time.time() - self._synced_at > CHANGE_RETENTION.total_seconds():
+            with self._build_lock:
+                self.rebuild()
+        else:
+            changes = db.session.query(
+                AutocompleteChange.id, AutocompleteChange.kind, AutocompleteChange.entity_id
+            ).filter(AutocompleteChange.id > self._last_change_id - CHANGE_OVERLAP).order_by(AutocompleteChange.id).all()
+            new = [change for change in changes if change.id not in self._applied]
+            if new:
+                doctor_ids = {change.entity_id for change in new if change.kind == 'doctors'}
+                patient_ids = {change.entity_id for change in new if change.kind == 'patients'}
+                doctors = dict.fromkeys(doctor_ids)
+                patients = dict.fromkeys(patient_ids)
+                if doctor_ids:
+                    for doctor_id, name, spec, is_active in db.session.query(
+                        Doctor.id, Doctor.name, Doctor.specialization, Doctor.is_active
+                    ).filter(Doctor.id.in_(doctor_ids)).all():
+                        doctors[doctor_id] = (name, spec, is_active is not False)
+                if patient_ids:
+                    patients.update(db.session.query(Patient.id, Patient.name).filter(Patient.id.in_(patient_ids)).all())
+                self.apply(doctors, patients)
+
+            with self._lock:
+                if changes:
+                    self._last_change_id = max(self._last_change_id, changes[-1].id)
+                self._applied = {change.id for change in changes if change.id > self._last_change_id - CHANGE_OVERLAP}
+                self._synced_at = time.time()
+                self.syncs += 1
+
+        if time.time() - self._pruned_at > PRUNE_SECONDS:
+            db.session.query(AutocompleteChange).filter(
+                AutocompleteChange.created_at < datetime.utcnow() - CHANGE_RETENTION
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            self._pruned_at = time.time()
+
+    def _set_specialization(self, spec, step):
+        if not spec:
+            return
+        self._specializations[spec] += step
+        if self._specializations[spec] > 0:
+            self._indexes['specializations'].set(spec.lower(), spec)
+        else:
+            del self._specializations[spec]
+            if not any(other.lower() == spec.lower() for other in self._specializations):
+                self._indexes['specializations'].remove(spec.lower())
+
+    # apply changes in place: doctors {id: (name, specialization, is_active) or None when deleted},
+    # patients {id: name or None}; replaying the same change twice is harmless
+    def apply(self, doctors, patients):
+        with self._lock:
+            if not self.built:
+                return
+            for doctor_id, values in doctors.items():
+                old = self._doctors.pop(doctor_id, None)
+                if old:
+                    self._indexes['doctors'].remove(doctor_id)
+                    self._set_specialization(old[1], -1)
+                if values and values[2] and values[0]:
+                    name, spec, _ = values
+                    self._doctors[doctor_id] = (name, spec)
+                    self._indexes['doctors'].set(doctor_id, name, {'specialization': spec})
+                    self._set_specialization(spec, 1)
+
+            for patient_id, name in patients.items():
+                if name:
+                    self._indexes['patients'].set(patient_id, name)
+                else:
+                    self._indexes['patients'].remove(patient_id)
+
+    # suggestions per kind: {'doctors': [{'id', 'name', 'specialization'}], 'specializations': [...], 'patients': [...]}
+    # build the index in the first request of a process that has none (e.g. under a wsgi server,
+    # where setup_db does not run); concurrent first requests wait for the one build
+    def ensure_built(self):
+        if self.built:
+            return
+        with self._build_lock:
+            if not self.built:
+                self.rebuild()
+
+    # answered from memory once the index is built
+    def suggest(self, prefix, kinds=AUTOCOMPLETE_KINDS, limit=AUTOCOMPLETE_LIMIT):
+        self.ensure_built()
+        self.start(current_app._get_current_object())
+        suggestions = {}
+        with self._lock:
+            for kind in kinds:
+                matches = self._indexes[kind].lookup(prefix, limit)
+                if kind == 'doctors':
+                    suggestions[kind] = [{'id': i, 'name': label, **payload} for i, label, payload in matches]
+                elif kind == 'specializations':
+                    suggestions[kind] = [label for _, label, _ in matches]
+                else:
+                    suggestions[kind] = [{'id': i, 'name': label} for i, label, _ in matches]
+        return suggestions
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self.built,
+                'rebuilds': self.rebuilds,
+                'syncs': self.syncs,
+                'last_change_id': self._last_change_id,
+                **{kind: len(index) for kind, index in self._indexes.items()}
+            }
+
+autocomplete = Autocomplete()
+
+# ?limit= of the autocomplete endpoints, raises ValueError
+def parse_autocomplete_limit(args):
+    try:
+        limit = int(args.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    return min(limit, MAX_AUTOCOMPLETE_LIMIT)
+
+# attributes that change suggestions
+TRACKED = {Doctor: ('name', 'specialization', 'is_active'), Patient: ('name',)}
+
+# collect doctor/patient changes at flush time and, when processes sync, log them for the others in
+# the same transaction; this process applies them once the transaction commits
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('autocomplete', {'doctors': {}, 'patients': {}})
+    changed = []
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) not in TRACKED:
+            continue
+        if obj not in session.new:
+            state = inspect(obj)
+            if not any(state.attrs[attr].history.has_changes() for attr in TRACKED[type(obj)]):
+                continue
+        if isinstance(obj, Doctor):
+            pending['doctors'][obj.id] = (obj.name, obj.specialization, obj.is_active is not False)
+            changed.append({'kind': 'doctors', 'entity_id': obj.id})
+        else:
+            pending['patients'][obj.id] = obj.name
+            changed.append({'kind': 'patients', 'entity_id': obj.id})
+
+    for obj in session.deleted:
+        if isinstance(obj, Doctor):
+            pending['doctors'][obj.id] = None
+            changed.append({'kind': 'doctors', 'entity_id': obj.id})
+        elif isinstance(obj, Patient):
+            pending['patients'][obj.id] = None
+            changed.append({'kind': 'patients', 'entity_id': obj.id})
+
+    if changed and AUTOCOMPLETE_SYNC_SECONDS:
+        now = datetime.utcnow()
+        session.connection().execute(
+            insert(AutocompleteChange.__table__), [{**change, 'created_at': now} for change in changed]
+        )
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    pending = session.info.pop('autocomplete', None)
+    if pending and (pending['doctors'] or pending['patients']):
+        autocomplete.apply(pending['doctors'], pending['patients'])
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('autocomplete', None)
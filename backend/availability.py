@@ -0,0 +1,236 @@
+from datetime import datetime, timedelta
+import calendar
+from database import db, get_upsert_insert
+from models import AvailabilityTemplate, DoctorAvailability
+
+# bookable sessions (hours per session live in slots.SLOT_HOURS)
+SLOT_TYPES = ('morning', 'evening')
+
+# rows written per upsert statement (4 bound values each, well under sqlite's variable limit)
+UPSERT_CHUNK = 500
+
+# raised when a submitted availability payload has invalid rows, carries one message per bad row
+class AvailabilityError(Exception):
+    def __init__(self, errors):
+        super().__init__('Invalid availability slots')
+        self.errors = errors
+
+# validate every submitted slot before anything is written
+# returns [(date, slot_type, is_available)] in payload order
+def parse_availability_rows(slots):
+    rows = []
+    errors = []
+    seen = set()
+
+    for index, slot_data in enumerate(slots):
+        if not isinstance(slot_data, dict):
+            errors.append(f'slots[{index}]: expected an object')
+            continue
+
+        try:
+            availability_date = datetime.strptime(str(slot_data.get('date')), '%Y-%m-%d').date()
+        except ValueError:
+            errors.append(f'slots[{index}]: invalid date, use YYYY-MM-DD')
+            continue
+
+        slot_type = slot_data.get('slot_type')
+        if slot_type not in SLOT_TYPES:
+            errors.append(f'slots[{index}]: slot_type must be one of {", ".join(SLOT_TYPES)}')
+            continue
+
+        is_available = slot_data.get('is_available', False)
+        if not isinstance(is_available, bool):
+            errors.append(f'slots[{index}]: is_available must be true or false')
+            continue
+
+        key = (availability_date, slot_type)
+        if key in seen:
+            errors.append(f'slots[{index}]: duplicate {slot_type} slot for {availability_date.isoformat()}')
+            continue
+        seen.add(key)
+        rows.append((availability_date, slot_type, is_available))
+
+    if errors:
+        raise AvailabilityError(errors)
+    return rows
+
+# insert or update many availability rows of one doctor, one select and one upsert per chunk
+# returns one result per row: {'date', 'slot_type', 'is_available', 'status': created|updated}
+def upsert_availability(doctor_id, rows):
+    table = DoctorAvailability.__table__
+    connection = db.session.connection()
+    insert = get_upsert_insert(connection)
+    now = datetime.utcnow()
+    results = []
+
+    for offset in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[offset:offset + UPSERT_CHUNK]
+        days = sorted(set(day for day, _, _ in chunk))
+
+        # existing keys decide created vs updated in the response
+        existing = set(connection.execute(
+            db.select(table.c.availability_date, table.c.slot_type).where(
+                table.c.doctor_id == doctor_id,
+                table.c.availability_date.between(days[0], days[-1])
+            )
+        ).all())
+
+        stmt = insert(table).values([
+            {
+                'doctor_id': doctor_id,
+                'availability_date': day,
+                'slot_type': slot_type,
+                'is_available': is_available,
+                'created_at': now
+            }
+            for day, slot_type, is_available in chunk
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['doctor_id', 'availability_date', 'slot_type'],
+            set_={'is_available': stmt.excluded.is_available}
+        )
+        connection.execute(stmt)
+
+        for day, slot_type, is_available in chunk:
+            results.append({
+                'date': day.isoformat(),
+                'slot_type': slot_type,
+                'is_available': is_available,
+                'status': 'updated' if (day, slot_type) in existing else 'created'
+            })
+
+    return results
+
+# validate a weekly template payload, weekday is 0-6 (monday first) or a day name
+# returns [(weekday, slot_type, is_available)]
+def parse_template_rows(templates):
+    rows = []
+    errors = []
+    seen = set()
+    day_names = [name.lower() for name in calendar.day_name]
+
+    for index, template in enumerate(templates):
+        if not isinstance(template, dict):
+            errors.append(f'templates[{index}]: expected an object')
+            continue
+
+        weekday = template.get('weekday')
+        if isinstance(weekday, str) and weekday.lower() in day_names:
+            weekday = day_names.index(weekday.lower())
+        if isinstance(weekday, bool) or not isinstance(weekday, int) or not 0 <= weekday <= 6:
+            errors.append(f'templates[{index}]: weekday must be 0-6 (monday = 0) or a day name')
+            continue
+
+        slot_type = template.get('slot_type')
+        if slot_type not in SLOT_TYPES:
+            errors.append(f'templates[{index}]: slot_type must be one of {", ".join(SLOT_TYPES)}')
+            continue
+
+        is_available = template.get('is_available', True)
+        if not isinstance(is_available, bool):
+            errors.append(f'templates[{index}]: is_available must be true or false')
+            continue
+
+        if (weekday, slot_type) in seen:
+            errors.append(f'templates[{index}]: duplicate {slot_type} template for {calendar.day_name[weekday]}')
+            continue
+        seen.add((weekday, slot_type))
+        rows.append((weekday, slot_type, is_available))
+
+    if errors:
+        raise AvailabilityError(errors)
+    return rows
+
+# replace a doctor's whole weekly template (caller commits)
+def replace_templates(doctor_id, rows):
+    AvailabilityTemplate.query.filter_by(doctor_id=doctor_id).delete(synchronize_session=False)
+    db.session.add_all([
+        AvailabilityTemplate(doctor_id=doctor_id, weekday=weekday, slot_type=slot_type, is_available=is_available)
+        for weekday, slot_type, is_available in rows
+    ])
+    db.session.flush()
+
+# (doctor_id, weekday, slot_type, is_available) of the doctors' weekly templates
+def templates_query(doctor_ids):
+    return db.session.query(
+        AvailabilityTemplate.doctor_id,
+        AvailabilityTemplate.weekday,
+        AvailabilityTemplate.slot_type,
+        AvailabilityTemplate.is_available
+    ).filter(AvailabilityTemplate.doctor_id.in_(doctor_ids))
+
+# (doctor_id, date, slot_type, is_available) of the doctors' per-date exceptions in a range
+def exceptions_query(doctor_ids, start_date, end_date):
+    return db.session.query(
+        DoctorAvailability.doctor_id,
+        DoctorAvailability.availability_date,
+        DoctorAvailability.slot_type,
+        DoctorAvailability.is_available
+    ).filter(
+        DoctorAvailability.doctor_id.in_(doctor_ids),
+        DoctorAvailability.availability_date >= start_date,
+        DoctorAvailability.availability_date <= end_date
+    )
+
+# expansion engine: effective availability per doctor, date and session over a date range
+# a DoctorAvailability row for the date wins, otherwise the weekly template applies, otherwise closed
+# returns {(doctor_id, date): {slot_type: (is_available, source)}} with source 'exception' or 'template',
+# sessions with neither are left out; costs one template and one exception query
+def expand_availability(doctor_ids, start_date, end_date):
+    doctor_ids = list(doctor_ids)
+    result = {}
+    if not doctor_ids or end_date < start_date:
+        return result
+
+    templates = {}
+    for doctor_id, weekday, slot_type, is_available in templates_query(doctor_ids).all():
+        templates.setdefault((doctor_id, weekday), {})[slot_type] = bool(is_available)
+
+    days = (end_date - start_date).days + 1
+    for doctor_id in doctor_ids:
+        for i in range(days):
+            day = start_date + timedelta(days=i)
+            sessions = templates.get((doctor_id, day.weekday()))
+            if sessions:
+                result[(doctor_id, day)] = {slot_type: (available, 'template') for slot_type, available in sessions.items()}
+
+    for doctor_id, day, slot_type, is_available in exceptions_query(doctor_ids, start_date, end_date).all():
+        result.setdefault((doctor_id, day), {})[slot_type] = (bool(is_available), 'exception')
+
+    return result
+
+# flat list of one doctor's effective sessions in DoctorAvailability.to_dict() shape
+def availability_entries(doctor_id, start_date, end_date, only_available=True):
+    expanded = expand_availability([doctor_id], start_date, end_date)
+    entries = []
+    for (_, day), sessions in sorted(expanded.items()):
+        for slot_type in SLOT_TYPES:
+            if slot_type not in sessions:
+                continue
+            is_available, source = sessions[slot_type]
+            if only_available and not is_available:
+                continue
+            entries.append({
+                'doctor_id': doctor_id,
+                'availability_date': day.isoformat(),
+                'slot_type': slot_type,
+                'is_available': is_available,
+                'source': source,
+                'time_range': '9:00 AM - 1:00 PM' if slot_type == 'morning' else '3:00 PM - 7:00 PM'
+            })
+    return entries
+
+# per-day morning/evening flags for one doctor over [start_date, end_date], built from one expansion
+def availability_calendar(doctor_id, start_date, end_date):
+    expanded = expand_availability([doctor_id], start_date, end_date)
+    calendar_days = []
+    for i in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=i)
+        sessions = expanded.get((doctor_id, day), {})
+        calendar_days.append({
+            'date': day.isoformat(),
+            'day_name': day.strftime('%A, %b %d'),
+            'morning_available': sessions.get('morning', (False, None))[0],
+            'evening_available': sessions.get('evening', (False, None))[0]
+        })
+    return calendar_days
@@ -0,0 +1,58 @@
+# set-slots write path: bulk upsert (availability.upsert_availability, timed as the whole request)
+# vs the find-or-create loop it replaced (timed as the bare loop)
+# run from backend/: python bench/bench_availability_upsert.py
+from datetime import date, timedelta
+import time
+from harness import counting, login, seeded_app
+
+SIZES = (1, 100, 1000)
+
+def slots_payload(size, start, is_available):
+    return [
+        {'date': (start + timedelta(days=i // 2)).isoformat(), 'slot_type': ('morning', 'evening')[i % 2], 'is_available': is_available}
+        for i in range(size)
+    ]
+
+# the per-row query + insert/update loop set-slots used before the bulk upsert
+def row_by_row(app, doctor_id, slots):
+    from database import db
+    from models import DoctorAvailability
+
+    with app.app_context():
+        for slot in slots:
+            day = date.fromisoformat(slot['date'])
+            row = DoctorAvailability.query.filter_by(doctor_id=doctor_id, availability_date=day, slot_type=slot['slot_type']).first()
+            if row:
+                row.is_available = slot['is_available']
+            else:
+                db.session.add(DoctorAvailability(doctor_id=doctor_id, availability_date=day, slot_type=slot['slot_type'], is_available=slot['is_available']))
+        db.session.commit()
+
+def timed(app, run):
+    with counting(app) as statements:
+        started = time.perf_counter()
+        run()
+        elapsed = (time.perf_counter() - started) * 1000
+    return len(statements), elapsed
+
+def main():
+    from models import Doctor, User
+
+    app = seeded_app()
+    client = app.test_client()
+    headers = login(client, 'ajay', 'ajay.kumar123')
+    with app.app_context():
+        doctor_id = Doctor.query.join(User).filter(User.username == 'rajesh').one().id
+
+    print(f"{'slots':>6}  {'run':<8} {'row by row (stmts / ms)':>24} {'bulk upsert (stmts / ms)':>26}")
+    for n, size in enumerate(SIZES):
+        # disjoint date ranges: the loop writes rajesh's rows, the endpoint ajay's
+        start = date.today() + timedelta(days=30 + n * 1000)
+        for run, available in (('created', True), ('updated', False)):
+            slots = slots_payload(size, start, available)
+            loop = timed(app, lambda: row_by_row(app, doctor_id, slots))
+            bulk = timed(app, lambda: client.post('/api/doctor/set-slots', json={'slots': slots}, headers=headers))
+            print(f'{size:>6}  {run:<8} {loop[0]:>12} / {loop[1]:>7.1f} ms {bulk[0]:>14} / {bulk[1]:>7.1f} ms')
+
+if __name__ == '__main__':
+    main()
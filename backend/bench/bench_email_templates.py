@@ -0,0 +1,66 @@
+# reminder email body: named jinja template vs the f-string layout it replaced
+# run from backend/: python bench/bench_email_templates.py
+import timeit
+import harness  # noqa: F401 (puts backend/ on sys.path)
+from celery_tasks.email_template import env, render_email, render_emails
+
+RENDERS = 20000
+BATCH = 1000
+
+CONTEXT = {'patient_name': 'Arjun Patel', 'doctor_name': 'Ajay Kumar', 'appointment_time': '10:00 AM'}
+
+# the layout and reminder body before the jinja templates (84ef894^), copied verbatim; no escaping
+def fstring_layout(title, content):
+    return f"""
+    <html>
+    <head>
+        <style>
+            body {{ font-family: sans-serif; background-color: #f4f4f4; padding: 20px; }}
+            .container {{ max-width: 600px; margin: auto; background: #fff; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
+            .header {{ background: #2c3e50; color: #fff; padding: 20px; text-align: center; }}
+            .content {{ padding: 20px; color: #333; line-height: 1.6; }}
+            .footer {{ background: #eee; padding: 10px; text-align: center; font-size: 12px; color: #777; }}
+            table {{ width: 100%; border-collapse: collapse; margin-top: 15px; }}
+            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+            th {{ background-color: #f2f2f2; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h2>{title}</h2>
+            </div>
+            <div class="content">
+                {content}
+                <p style="margin-top: 30px;">Regards,<br>MediHub Support Team</p>
+            </div>
+            <div class="footer">
+                <p>&copy; MediHub</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+def fstring_email(patient_name, doctor_name, appointment_time):
+    content = f"""
+        <p>Hi {patient_name},</p>
+        <p>You have an appointment today with <strong>Dr. {doctor_name}</strong> at <strong>{appointment_time}</strong>.</p>
+        <p>Please arrive 10 minutes early to complete any necessary paperwork.</p>
+    """
+    return fstring_layout("Appointment Reminder", content)
+
+def per_message(run, number):
+    return min(timeit.repeat(run, number=number, repeat=3)) / number * 1e6
+
+def main():
+    # compile outside the timings, as a warm worker would have
+    env.get_template('reminder.html')
+    contexts = [CONTEXT] * BATCH
+
+    print(f"{'f-string layout (old)':<34} {per_message(lambda: fstring_email(**CONTEXT), RENDERS):6.1f} us/message")
+    print(f"{'render_email (cached template)':<34} {per_message(lambda: render_email('reminder', **CONTEXT), RENDERS):6.1f} us/message")
+    print(f"{'render_emails, batch of %d' % BATCH:<34} {per_message(lambda: render_emails('reminder', contexts), RENDERS // BATCH) / BATCH:6.1f} us/message")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# throwaway sqlite file, set before app.py reads DATABASE_URL
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+# the app on a freshly migrated and seeded database
+def seeded_app():
+    from app import app
+    from database import db
+    from migrations import migrate
+    import seed_db
+
+    with app.app_context():
+        migrate()
+        seed_db.create_admin_user()
+        seed_db.create_sample_doctors()
+        seed_db.create_sample_availability()
+        seed_db.create_sample_patients()
+        db.session.remove()
+    return app
+
+def login(client, username, password):
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    return {'Authorization': 'Bearer ' + response.get_json()['data']['token']}
+
+# with counting(app) as statements: ... collects the sql sent to the database
+@contextmanager
+def counting(app):
+    from database import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,78 @@
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import Appointment
+from counters import record_appointment_change
+from outbox import enqueue_appointment_notifications
+
+# statuses whose row may be taken over by a new booking of the same doctor/date/time
+REUSABLE_STATUSES = ('cancelled', 'available')
+
+# raised when the slot is taken (or was taken concurrently)
+class SlotConflict(Exception):
+    pass
+
+# book one doctor hour in a single transaction
+# the unique_doctor_slot row is either inserted, or reused if it only holds a cancelled/open slot;
+# a lost race surfaces as SlotConflict instead of a duplicate or an IntegrityError
+def reserve_slot(doctor_id, patient_id, apt_date, apt_time, notes=''):
+    now = datetime.utcnow()
+    existing = db.session.query(Appointment.id, Appointment.status, Appointment.patient_id).filter_by(
+        doctor_id=doctor_id,
+        appointment_date=apt_date,
+        appointment_time=apt_time
+    ).first()
+
+    try:
+        if existing is None:
+            appointment = Appointment(
+                doctor_id=doctor_id,
+                patient_id=patient_id,
+                appointment_date=apt_date,
+                appointment_time=apt_time,
+                status='booked',
+                notes=notes
+            )
+            db.session.add(appointment)
+            db.session.flush()
+            enqueue_appointment_notifications(appointment.id, 'confirmation')
+            db.session.commit()
+            return appointment
+
+        if existing.status not in REUSABLE_STATUSES:
+            raise SlotConflict('This slot is already booked')
+
+        # compare-and-set on the status we read, so only one racer can take the row over
+        result = db.session.execute(
+            update(Appointment).where(
+                Appointment.id == existing.id,
+                Appointment.status == existing.status,
+                ~Appointment.treatments.any()
+            ).values(
+                patient_id=patient_id,
+                status='booked',
+                notes=notes,
+                created_at=now,
+                updated_at=now
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            raise SlotConflict('This slot is already booked')
+
+        # core update bypasses the flush hook, so record the counter change here
+        slot = {'doctor_id': doctor_id, 'appointment_date': apt_date}
+        record_appointment_change(
+            db.session.connection(),
+            dict(slot, patient_id=existing.patient_id, status=existing.status),
+            dict(slot, patient_id=patient_id, status='booked')
+        )
+        enqueue_appointment_notifications(existing.id, 'confirmation')
+        db.session.commit()
+        return db.session.get(Appointment, existing.id, populate_existing=True)
+
+    except IntegrityError:
+        # unique key taken by a concurrent insert
+        db.session.rollback()
+        raise SlotConflict('This slot is already booked')
@@ -0,0 +1,229 @@
+from collections import OrderedDict
+from threading import Lock
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# single-flight locks are striped by key hash: bounded memory, unrelated keys rarely share a stripe
+KEY_LOCK_STRIPES = 64
+
+# in-process LRU tier, entries also carry an absolute expiry time
+class LocalTier:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# shared tier in redis (json values), visible to every gunicorn/celery worker
+class RedisTier:
+    def __init__(self, url, prefix='hms:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_versions(self, tags):
+        if not tags:
+            return {}
+        values = self.client.mget([self.prefix + 'tag:' + tag for tag in tags])
+        return {tag: int(v) if v is not None else 0 for tag, v in zip(tags, values)}
+
+    def bump(self, tag):
+        return self.client.incr(self.prefix + 'tag:' + tag)
+
+    def acquire(self, key, timeout):
+        return bool(self.client.set(self.prefix + 'lock:' + key, '1', nx=True, px=int(timeout * 1000)))
+
+    def release(self, key):
+        self.client.delete(self.prefix + 'lock:' + key)
+
+# two tier cache with ttl, tag based invalidation and single-flight recompute
+# entries remember the version of each tag when stored, bumping a tag makes them stale;
+# the local tier keeps entries for at most local_ttl seconds so other workers' invalidations show up quickly
+class Cache:
+    def __init__(self, shared=None, local_size=1000, local_ttl=5, lock_timeout=10):
+        self.local = LocalTier(local_size)
+        self.shared = shared
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self._tag_versions = {}
+        self._key_locks = [Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_errors = 0
+        self._shared_down_until = 0
+
+    @classmethod
+    def from_env(cls):
+        shared = None
+        url = os.getenv('CACHE_REDIS_URL')
+        if url:
+            try:
+                shared = RedisTier(url)
+            except ImportError:
+                logger.warning('redis package missing, using local cache only')
+        return cls(
+            shared=shared,
+            local_size=int(os.getenv('CACHE_LOCAL_SIZE', 1000)),
+            local_ttl=int(os.getenv('CACHE_LOCAL_TTL', 5))
+        )
+
+    def _shared_call(self, method, *args):
+        # a redis outage degrades to the local tier for a while instead of failing requests
+        if self.shared is None or time.time() < self._shared_down_until:
+            return None
+        try:
+            return getattr(self.shared, method)(*args)
+        except Exception as e:
+            self.shared_errors += 1
+            self._shared_down_until = time.time() + 30
+            logger.warning('shared cache %s failed: %s', method, e)
+            return None
+
+    def _versions(self, tags, local_only=False):
+        if not tags:
+            return {}
+        if not local_only:
+            versions = self._shared_call('get_versions', list(tags))
+            if versions is not None:
+                # remember the latest versions so local tier checks can skip the round trip
+                with self._lock:
+                    for tag, version in versions.items():
+                        self._tag_versions[tag] = max(self._tag_versions.get(tag, 0), version)
+                return versions
+        return {tag: self._tag_versions.get(tag, 0) for tag in tags}
+
+    def _fresh(self, entry, local_only=False):
+        return entry is not None and entry['tags'] == self._versions(entry['tags'], local_only)
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if self._fresh(entry, local_only=True):
+            self.hits += 1
+            return entry['value']
+
+        entry = self._shared_call('get', key)
+        if self._fresh(entry):
+            self.local.set(key, entry, min(self.local_ttl, entry['ttl']))
+            self.hits += 1
+            return entry['value']
+
+        self.misses += 1
+        return None
+
+    # versions: tag versions read before the value was computed (get_or_set); an invalidation that
+    # lands while the value is computed then leaves the entry stale instead of marking it fresh
+    def set(self, key, value, ttl=300, tags=(), versions=None):
+        if versions is None:
+            versions = self._versions(tuple(tags))
+        entry = {'value': value, 'ttl': ttl, 'tags': versions}
+        self.local.set(key, entry, min(self.local_ttl, ttl) if self.shared else ttl)
+        self._shared_call('set', key, entry, ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self._shared_call('delete', key)
+
+    # mark every entry stored under these tags as stale, in this process and the shared tier
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            with self._lock:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+            shared_version = self._shared_call('bump', tag)
+            if shared_version is not None:
+                with self._lock:
+                    self._tag_versions[tag] = max(self._tag_versions[tag], shared_version)
+
+    # return cached value or compute it once; concurrent callers wait for the first computation
+    # instead of all hitting the database (None results are not cached)
+    def get_or_set(self, key, loader, ttl=300, tags=()):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        key_lock = self._key_locks[hash(key) % KEY_LOCK_STRIPES]
+
+        with key_lock:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            # another worker may already be computing it, give it a moment
+            acquired = self._shared_call('acquire', key, self.lock_timeout)
+            if self.shared is not None and acquired is False:
+                deadline = time.time() + self.lock_timeout
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    value = self.get(key)
+                    if value is not None:
+                        return value
+
+            try:
+                versions = self._versions(tuple(tags))
+                value = loader()
+                if value is not None:
+                    self.set(key, value, ttl, tags, versions)
+                return value
+            finally:
+                if acquired:
+                    self._shared_call('release', key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': 'redis' if self.shared else 'local',
+            'local_size': len(self.local),
+            'local_max_entries': self.local.max_entries,
+            'local_evictions': self.local.evictions,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'shared_errors': self.shared_errors
+        }
+
+cache = Cache.from_env()
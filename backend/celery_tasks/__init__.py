@@ -0,0 +1,21 @@
+# celery app and tasks, importable as `from celery_tasks import <task>`
+from .imports import celery
+from .reminders import daily_reminders, send_reminder_batch, reminders_summary
+from .reports import monthly_report, send_monthly_report, patient_history_export
+from .email import booking_confirmation, booking_cancellation, doctor_login
+from .outbox import dispatch_outbox, flush_digests
+
+__all__ = [
+    'celery',
+    'daily_reminders',
+    'send_reminder_batch',
+    'reminders_summary',
+    'monthly_report',
+    'send_monthly_report',
+    'patient_history_export',
+    'booking_confirmation',
+    'booking_cancellation',
+    'doctor_login',
+    'dispatch_outbox',
+    'flush_digests'
+]
@@ -0,0 +1,93 @@
+from kombu import Queue
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# queue per workload, so a long report or export run never holds up booking emails
+# per queue: worker concurrency and prefetch (applied via CELERY_WORKER_QUEUE), per-task rate limit
+# and soft/hard time limits in seconds; each value can be overridden with CELERY_<QUEUE>_<SETTING>,
+# e.g. CELERY_EMAIL_BULK_RATE_LIMIT=60/m or CELERY_EXPORTS_TIME_LIMIT=1800
+QUEUE_PROFILES = {
+    'email-realtime': {'concurrency': 4, 'prefetch_multiplier': 4, 'rate_limit': None, 'soft_time_limit': 120, 'time_limit': 150},
+    'email-bulk': {'concurrency': 2, 'prefetch_multiplier': 1, 'rate_limit': '120/m', 'soft_time_limit': 300, 'time_limit': 360},
+    'reports': {'concurrency': 1, 'prefetch_multiplier': 1, 'rate_limit': None, 'soft_time_limit': 600, 'time_limit': 660},
+    'exports': {'concurrency': 2, 'prefetch_multiplier': 1, 'rate_limit': '10/m', 'soft_time_limit': 900, 'time_limit': 960}
+}
+
+DEFAULT_QUEUE = 'email-realtime'
+
+# task name -> queue
+TASK_QUEUES = {
+    'celery_tasks.email.booking_confirmation': 'email-realtime',
+    'celery_tasks.email.booking_cancellation': 'email-realtime',
+    'celery_tasks.email.doctor_login': 'email-realtime',
+    'celery_tasks.outbox.dispatch_outbox': 'email-realtime',
+    'celery_tasks.outbox.flush_digests': 'email-bulk',
+    'celery_tasks.reminders.daily_reminders': 'email-bulk',
+    'celery_tasks.reminders.send_reminder_batch': 'email-bulk',
+    'celery_tasks.reminders.reminders_summary': 'email-bulk',
+    'celery_tasks.reports.send_monthly_report': 'email-bulk',
+    'celery_tasks.reports.monthly_report': 'reports',
+    'celery_tasks.reports.patient_history_export': 'exports'
+}
+
+# effective profile of one queue, env overrides applied ('none' clears a rate limit)
+def queue_profile(queue):
+    profile = dict(QUEUE_PROFILES[queue])
+    prefix = 'CELERY_' + queue.upper().replace('-', '_') + '_'
+    for setting, default in profile.items():
+        value = os.getenv(prefix + setting.upper())
+        if value is None:
+            continue
+        if setting == 'rate_limit':
+            profile[setting] = None if value.lower() in ('', 'none') else value
+        else:
+            profile[setting] = type(default)(value)
+    return profile
+
+# celery settings, all from env; CELERY_BROKER_URL=memory:// with
+# CELERY_RESULT_BACKEND=cache+memory:// runs without redis (tests, one-process setups)
+def celery_config():
+    profiles = {queue: queue_profile(queue) for queue in QUEUE_PROFILES}
+
+    annotations = {}
+    for task_name, queue in TASK_QUEUES.items():
+        profile = profiles[queue]
+        annotations[task_name] = {
+            'soft_time_limit': profile['soft_time_limit'],
+            'time_limit': profile['time_limit']
+        }
+        if profile['rate_limit']:
+            annotations[task_name]['rate_limit'] = profile['rate_limit']
+
+    config = {
+        'broker_url': os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+        'result_backend': os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),
+        'broker_connection_retry_on_startup': True,
+        'task_serializer': 'json',
+        'result_serializer': 'json',
+        'accept_content': ['json'],
+        'timezone': os.getenv('CELERY_TIMEZONE', 'UTC'),
+        'task_queues': [Queue(queue, routing_key=queue) for queue in QUEUE_PROFILES],
+        'task_default_queue': DEFAULT_QUEUE,
+        'task_default_routing_key': DEFAULT_QUEUE,
+        'task_routes': {task_name: {'queue': queue, 'routing_key': queue} for task_name, queue in TASK_QUEUES.items()},
+        'task_annotations': annotations,
+        # export status/download look results up by task id, keep them as long as the files
+        'result_expires': int(os.getenv('CELERY_RESULT_EXPIRES', 86400)),
+        # limits for anything not listed in TASK_QUEUES
+        'task_soft_time_limit': int(os.getenv('CELERY_TASK_SOFT_TIME_LIMIT', 300)),
+        'task_time_limit': int(os.getenv('CELERY_TASK_TIME_LIMIT', 360)),
+        'worker_max_tasks_per_child': int(os.getenv('CELERY_MAX_TASKS_PER_CHILD', 1000))
+    }
+
+    # a worker started for one queue takes that queue's concurrency and prefetch
+    worker_queue = os.getenv('CELERY_WORKER_QUEUE')
+    if worker_queue:
+        if worker_queue not in profiles:
+            raise ValueError(f'CELERY_WORKER_QUEUE must be one of {", ".join(QUEUE_PROFILES)}')
+        config['worker_concurrency'] = profiles[worker_queue]['concurrency']
+        config['worker_prefetch_multiplier'] = profiles[worker_queue]['prefetch_multiplier']
+
+    return config
@@ -1,55 +1,56 @@
 from .imports import celery
-from .email_template import get_email_template
+from .email_template import render_email
 from flask_mail import Message
-from models import Appointment, Doctor
-from database import db
+from models import Doctor
+
+# appointment notifications: template name -> (subject, recipient side)
+APPOINTMENT_EMAILS = {
+    'booking_confirmation_patient': ("Appointment Confirmation - MediHub", 'patient'),
+    'booking_confirmation_doctor': ("New Appointment Booking - MediHub", 'doctor'),
+    'booking_cancellation_patient': ("Appointment Cancellation - MediHub", 'patient'),
+    'booking_cancellation_doctor': ("Appointment Cancellation - MediHub", 'doctor')
+}
+
+# build one appointment notification from its payload snapshot (see outbox.appointment_payload),
+# None if the recipient has no email
+def appointment_message(kind, payload):
+    subject, _ = APPOINTMENT_EMAILS[kind]
+    if not payload.get('recipient'):
+        return None
+
+    html = render_email(
+        kind,
+        patient_name=payload.get('patient_name') or 'N/A',
+        doctor_name=payload.get('doctor_name') or 'N/A',
+        appointment_date=payload.get('appointment_date'),
+        appointment_time=payload.get('appointment_time')
+    )
+    return Message(subject=subject, recipients=[payload['recipient']], html=html)
+
+# patient and doctor emails of an appointment event, from the appointment as it is now
+def _event_messages(appointment_id, event):
+    from outbox import appointment_details, appointment_payload
+    details = appointment_details(appointment_id)
+    if details is None:
+        return None
+    return [
+        appointment_message(kind, appointment_payload(appointment_id, event, side, details))
+        for kind, (_, side) in APPOINTMENT_EMAILS.items() if kind.startswith(f'booking_{event}_')
+    ]
 
 @celery.task
 def booking_confirmation(appointment_id):
     from app import app, mail
     with app.app_context():
-        appointment = Appointment.query.get(appointment_id)
-        if not appointment:
+        messages = _event_messages(appointment_id, 'confirmation')
+        if messages is None:
             return f"Appointment {appointment_id} not found"
-        
-        patient = appointment.patient
-        doctor = appointment.doctor
-        
-        if not (patient and patient.user and doctor and doctor.user):
+        if None in messages:
             return "Missing user details for email"
-
-        # Email to Patient
-        patient_content = f"""
-            <p>Hi {patient.name},</p>
-            <p>Your appointment has been successfully booked.</p>
-            <p><strong>Doctor:</strong> Dr. {doctor.name}</p>
-            <p><strong>Date:</strong> {appointment.appointment_date}</p>
-            <p><strong>Time:</strong> {appointment.appointment_time}</p>
-            <p>Please arrive 10 minutes early.</p>
-        """
-        patient_html = get_email_template("Appointment Confirmation", patient_content)
-        msg_patient = Message(
-            subject="Appointment Confirmation - MediHub",
-            recipients=[patient.user.email],
-            html=patient_html
-        )
-        mail.send(msg_patient)
-
-        # Email to Doctor
-        doctor_content = f"""
-            <p>Hi Dr. {doctor.name},</p>
-            <p>A new appointment has been booked.</p>
-            <p><strong>Patient:</strong> {patient.name}</p>
-            <p><strong>Date:</strong> {appointment.appointment_date}</p>
-            <p><strong>Time:</strong> {appointment.appointment_time}</p>
-        """
-        doctor_html = get_email_template("New Appointment Booking", doctor_content)
-        msg_doctor = Message(
-            subject="New Appointment Booking - MediHub",
-            recipients=[doctor.user.email],
-            html=doctor_html
-        )
-        mail.send(msg_doctor)
+        
+        with mail.connect() as conn:
+            for msg in messages:
+                conn.send(msg)
         
         return f"Sent booking confirmation for Appointment {appointment_id}"
 
@@ -57,47 +58,15 @@ def booking_confirmation(appointment_id):
 def booking_cancellation(appointment_id):
     from app import app, mail
     with app.app_context():
-        appointment = Appointment.query.get(appointment_id)
-        if not appointment:
+        messages = _event_messages(appointment_id, 'cancellation')
+        if messages is None:
             return f"Appointment {appointment_id} not found"
-        
-        patient = appointment.patient
-        doctor = appointment.doctor
-        
-        if not (patient and patient.user and doctor and doctor.user):
+        if None in messages:
             return "Missing user details for email"
-
-        # Email to Patient
-        patient_content = f"""
-            <p>Hi {patient.name},</p>
-            <p>Your appointment has been cancelled.</p>
-            <p><strong>Doctor:</strong> Dr. {doctor.name}</p>
-            <p><strong>Date:</strong> {appointment.appointment_date}</p>
-            <p><strong>Time:</strong> {appointment.appointment_time}</p>
-        """
-        patient_html = get_email_template("Appointment Cancellation", patient_content)
-        msg_patient = Message(
-            subject="Appointment Cancellation - MediHub",
-            recipients=[patient.user.email],
-            html=patient_html
-        )
-        mail.send(msg_patient)
-
-        # Email to Doctor
-        doctor_content = f"""
-            <p>Hi Dr. {doctor.name},</p>
-            <p>An appointment has been cancelled.</p>
-            <p><strong>Patient:</strong> {patient.name}</p>
-            <p><strong>Date:</strong> {appointment.appointment_date}</p>
-            <p><strong>Time:</strong> {appointment.appointment_time}</p>
-        """
-        doctor_html = get_email_template("Appointment Cancellation", doctor_content)
-        msg_doctor = Message(
-            subject="Appointment Cancellation - MediHub",
-            recipients=[doctor.user.email],
-            html=doctor_html
-        )
-        mail.send(msg_doctor)
+        
+        with mail.connect() as conn:
+            for msg in messages:
+                conn.send(msg)
         
         return f"Sent cancellation emails for Appointment {appointment_id}"
 
@@ -109,14 +78,7 @@ def doctor_login(doctor_id, password):
         if not doctor or not doctor.user:
             return f"Doctor {doctor_id} not found"
 
-        content = f"""
-            <p>Hi Dr. {doctor.name},</p>
-            <p>Your account has been created on MediHub.</p>
-            <p><strong>Username:</strong> {doctor.user.username}</p>
-            <p><strong>Password:</strong> {password}</p>
-            <p>Please login and change your password immediately.</p>
-        """
-        html = get_email_template("Welcome to MediHub", content)
+        html = render_email('doctor_login', doctor_name=doctor.name, username=doctor.user.username, password=password)
         
         msg = Message(
             subject="Your MediHub Account Details",
@@ -1,31 +1,27 @@
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+import os
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+# one environment per worker process: templates are compiled once and kept in its cache
+# (auto_reload off, so no stat() per render); values are html-escaped
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False,
+    cache_size=100
+)
+
+# render a named email template (templates/<name>.html) with the given context
+def render_email(name, **context):
+    return env.get_template(f'{name}.html').render(**context)
+
+# render one template for many contexts, the template is looked up once
+def render_emails(name, contexts):
+    template = env.get_template(f'{name}.html')
+    return [template.render(**context) for context in contexts]
+
+# wrap prebuilt html content in the standard email layout
 def get_email_template(title, content):
-    return f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: sans-serif; background-color: #f4f4f4; padding: 20px; }}
-            .container {{ max-width: 600px; margin: auto; background: #fff; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-            .header {{ background: #2c3e50; color: #fff; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; color: #333; line-height: 1.6; }}
-            .footer {{ background: #eee; padding: 10px; text-align: center; font-size: 12px; color: #777; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 15px; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h2>{title}</h2>
-            </div>
-            <div class="content">
-                {content}
-                <p style="margin-top: 30px;">Regards,<br>MediHub Support Team</p>
-            </div>
-            <div class="footer">
-                <p>&copy; MediHub</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    return env.get_template('base.html').render(title=title, content=Markup(content))
@@ -1,19 +1,17 @@
 from celery import Celery
 from celery.schedules import crontab
-from dotenv import load_dotenv
+from .config import celery_config
 import os
 
-load_dotenv()
-
+# the only celery app: workers, beat and the flask app (app.make_celery) all use this instance
 celery = Celery('hospital_management')
-celery.conf.broker_url = 'redis://localhost:6379/0'
-celery.conf.result_backend = 'redis://localhost:6379/0'
-celery.conf.broker_connection_retry_on_startup = True
+celery.conf.update(celery_config())
 
 # Import tasks to ensure they are registered
 from .reminders import daily_reminders
 from .reports import monthly_report, patient_history_export
 from .email import booking_confirmation, booking_cancellation, doctor_login
+from .outbox import dispatch_outbox, flush_digests
 
 @celery.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
@@ -27,3 +25,13 @@ def setup_periodic_tasks(sender, **kwargs):
         crontab(day_of_month=1, hour=8, minute=0),
         monthly_report.s()
     )
+    # drain the notification outbox
+    sender.add_periodic_task(
+        float(os.getenv('OUTBOX_DISPATCH_SECONDS', 10)),
+        dispatch_outbox.s()
+    )
+    # send doctor notification digests whose window has passed
+    sender.add_periodic_task(
+        float(os.getenv('DIGEST_FLUSH_SECONDS', 60)),
+        flush_digests.s()
+    )
@@ -0,0 +1,140 @@
+from .imports import celery
+from .email import APPOINTMENT_EMAILS, appointment_message
+from .email_template import render_email
+from flask_mail import Message
+from smtplib import SMTPException, SMTPServerDisconnected
+
+# drain the outbox: claim due messages in batches and send each batch over one smtp connection
+# runs periodically, so requests only write an outbox row and never wait on the broker or smtp
+@celery.task
+def dispatch_outbox(max_batches=10):
+    from app import app, mail
+    from outbox import claim_batch, finish_batch, purge_sent
+    with app.app_context():
+        totals = {'sent': 0, 'failed': 0, 'dropped': 0, 'batches': 0}
+        for _ in range(max_batches):
+            batch = claim_batch()
+            if not batch:
+                break
+            sent, failed, dropped = _deliver(batch, mail)
+            finish_batch(sent, failed, dropped)
+            totals['batches'] += 1
+            totals['sent'] += len(sent)
+            totals['failed'] += len(failed)
+            totals['dropped'] += len(dropped)
+        totals['purged'] = purge_sent()
+        return totals
+
+# send buffered doctor-side notifications as one digest email per doctor
+@celery.task
+def flush_digests(max_batches=10):
+    from app import app, mail
+    from outbox import claim_digests, finish_batch, NOTIFICATION_DIGEST_MINUTES
+    with app.app_context():
+        totals = {'digests': 0, 'messages': 0, 'failed': 0, 'dropped': 0}
+        for _ in range(max_batches):
+            batch = claim_digests(NOTIFICATION_DIGEST_MINUTES)
+            if not batch:
+                break
+            sent, failed, dropped, digests = _deliver_digests(batch, mail)
+            finish_batch(sent, failed, dropped)
+            totals['digests'] += digests
+            totals['messages'] += len(sent)
+            totals['failed'] += len(failed)
+            totals['dropped'] += len(dropped)
+        return totals
+
+# labels of the notification kinds a digest can summarize
+DIGEST_LABELS = {
+    'booking_confirmation_doctor': 'New booking',
+    'booking_cancellation_doctor': 'Cancelled'
+}
+
+# group a claimed digest batch by recipient and send one email each over one smtp connection
+# every line is rendered from its message's payload snapshot, never from the appointment row as it is now
+def _deliver_digests(batch, mail):
+    groups = {}
+    dropped = []
+    for message in batch:
+        if message.kind not in DIGEST_LABELS:
+            dropped.append((message, f'unknown digest kind {message.kind}'))
+            continue
+        payload = message.payload
+        if not payload.get('recipient'):
+            dropped.append((message, 'recipient email missing'))
+            continue
+        groups.setdefault(message.digest_key, []).append((message, payload))
+
+    outgoing = []
+    for items in groups.values():
+        # the latest snapshot has the doctor's current address
+        latest = items[-1][1]
+        events = [{
+            'label': DIGEST_LABELS[message.kind],
+            'patient_name': payload.get('patient_name') or 'N/A',
+            'appointment_date': payload.get('appointment_date'),
+            'appointment_time': payload.get('appointment_time')
+        } for message, payload in items]
+        email = Message(
+            subject=f"{len(events)} appointment update{'' if len(events) == 1 else 's'} - MediHub",
+            recipients=[latest['recipient']],
+            html=render_email('doctor_digest', doctor_name=latest.get('doctor_name') or 'N/A', events=events)
+        )
+        outgoing.append(([message for message, _ in items], email))
+
+    sent, failed = [], []
+    digests = 0
+    if outgoing:
+        try:
+            with mail.connect() as conn:
+                for i, (messages, email) in enumerate(outgoing):
+                    try:
+                        conn.send(email)
+                        sent.extend(messages)
+                        digests += 1
+                    except SMTPServerDisconnected as e:
+                        failed.extend((m, e) for group, _ in outgoing[i:] for m in group)
+                        break
+                    except SMTPException as e:
+                        failed.extend((m, e) for m in messages)
+        except (SMTPException, OSError) as e:
+            done = set(id(m) for m in sent) | set(id(m) for m, _ in failed)
+            failed.extend((m, e) for group, _ in outgoing for m in group if id(m) not in done)
+
+    return sent, failed, dropped, digests
+
+# build and send the messages of one claimed batch, returns (sent, [(msg, error)], [(msg, reason)])
+# emails are built from the payload snapshot only, never from the appointment row as it is now
+def _deliver(batch, mail):
+    sent, failed, dropped = [], [], []
+    outgoing = []
+    for message in batch:
+        if message.kind not in APPOINTMENT_EMAILS:
+            dropped.append((message, f'unknown message kind {message.kind}'))
+            continue
+        email = appointment_message(message.kind, message.payload)
+        if email is None:
+            dropped.append((message, 'recipient email missing'))
+            continue
+        outgoing.append((message, email))
+
+    if not outgoing:
+        return sent, failed, dropped
+
+    try:
+        with mail.connect() as conn:
+            for i, (message, email) in enumerate(outgoing):
+                try:
+                    conn.send(email)
+                    sent.append(message)
+                except SMTPServerDisconnected as e:
+                    # connection is gone, the rest of the batch is retried later
+                    failed.extend((m, e) for m, _ in outgoing[i:])
+                    break
+                except SMTPException as e:
+                    failed.append((message, e))
+    except (SMTPException, OSError) as e:
+        done = set(id(m) for m in sent) | set(id(m) for m, _ in failed)
+        failed.extend((m, e) for m, _ in outgoing if id(m) not in done)
+
+    return sent, failed, dropped
@@ -1,31 +1,97 @@
 from .imports import celery
-from .email_template import get_email_template
+from .email_template import render_emails
+from celery import chord
 from flask_mail import Message
 from models import Appointment
 from datetime import date
+from smtplib import SMTPException, SMTPServerDisconnected
+import os
 
+# appointments handled per subtask, each subtask sends over one smtp connection
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 200))
+
+# fan out today's reminders: one subtask per batch of appointment ids, summary once all batches finish
 @celery.task
 def daily_reminders():
-    from app import app, mail
+    from app import app
+    from queries import reminder_ids_query
     with app.app_context():
         today = date.today()
-        appts = Appointment.query.filter_by(appointment_date=today, status='booked').all()
-        for appt in appts:
-            if not (appt.patient and appt.patient.user and appt.doctor):
-                continue
-            patient_email = appt.patient.user.email
-            patient_name = appt.patient.name
-            doctor_name = appt.doctor.name
-            appointment_time = appt.appointment_time
-            
-            content = f"""
-                <p>Hi {patient_name},</p>
-                <p>You have an appointment today with <strong>Dr. {doctor_name}</strong> at <strong>{appointment_time}</strong>.</p>
-                <p>Please arrive 10 minutes early to complete any necessary paperwork.</p>
-            """
-            html = get_email_template("Appointment Reminder", content)
-            
-            msg = Message(subject=f"Appointment Reminder - {today}", recipients=[patient_email])
-            msg.html = html
-            mail.send(msg)
-        return f"Sent {len(appts)} reminders for {today}"
+        ids = [row.id for row in reminder_ids_query(today)]
+
+        if not ids:
+            return f"Sent 0 reminders for {today}"
+
+        batches = [ids[i:i + REMINDER_BATCH_SIZE] for i in range(0, len(ids), REMINDER_BATCH_SIZE)]
+        chord(send_reminder_batch.s(batch, today.isoformat()) for batch in batches)(
+            reminders_summary.s(today.isoformat())
+        )
+        return f"Queued {len(ids)} reminders for {today} in {len(batches)} batches"
+
+# send one batch over a single smtp connection
+# a refused recipient or rejected message is counted as failed and the batch goes on;
+# only a lost/failed connection retries the unsent rest, and once retries run out the rest is
+# counted as failed so the chord summary still arrives
+@celery.task(bind=True, max_retries=3, default_retry_delay=60)
+def send_reminder_batch(self, appointment_ids, day, sent=0, skipped=0, failed=0):
+    from app import app, mail
+    from serializers import with_relations
+    with app.app_context():
+        today = date.fromisoformat(day)
+        appts = with_relations(Appointment.query, Appointment, 'patient.user', 'doctor').filter(
+            Appointment.id.in_(appointment_ids),
+            Appointment.status == 'booked'
+        ).order_by(Appointment.id).all()
+
+        # cancelled since the batch was queued, or missing contact details
+        appts = [appt for appt in appts if appt.patient and appt.patient.user and appt.doctor]
+        skipped += len(appointment_ids) - len(appts)
+        htmls = render_emails('reminder', [{
+            'patient_name': appt.patient.name,
+            'doctor_name': appt.doctor.name,
+            'appointment_time': appt.appointment_time
+        } for appt in appts])
+
+        done = 0
+        try:
+            with mail.connect() as conn:
+                for appt, html in zip(appts, htmls):
+                    msg = Message(subject=f"Appointment Reminder - {today}", recipients=[appt.patient.user.email])
+                    msg.html = html
+                    try:
+                        conn.send(msg)
+                        sent += 1
+                    except SMTPServerDisconnected:
+                        raise
+                    except SMTPException:
+                        # this recipient only, retrying the batch would not help
+                        failed += 1
+                    done += 1
+        except (SMTPException, OSError) as e:
+            remaining = [appt.id for appt in appts[done:]]
+            if remaining:
+                if self.request.retries >= self.max_retries:
+                    failed += len(remaining)
+                else:
+                    # counts so far travel with the retry so the summary stays exact
+                    raise self.retry(
+                        args=(remaining, day),
+                        kwargs={'sent': sent, 'skipped': skipped, 'failed': failed},
+                        exc=e,
+                        countdown=self.default_retry_delay * 2 ** self.request.retries
+                    )
+
+        return {'sent': sent, 'skipped': skipped, 'failed': failed, 'attempts': self.request.retries + 1}
+
+# chord callback: totals of all batches
+@celery.task
+def reminders_summary(results, day):
+    summary = {
+        'date': day,
+        'batches': len(results),
+        'sent': sum(r['sent'] for r in results),
+        'skipped': sum(r['skipped'] for r in results),
+        'failed': sum(r.get('failed', 0) for r in results),
+        'retried_batches': sum(1 for r in results if r['attempts'] > 1)
+    }
+    return summary
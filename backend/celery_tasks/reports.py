@@ -1,115 +1,280 @@
 from .imports import celery
-from .email_template import get_email_template
+from .email_template import render_email
+from celery import group
 from flask_mail import Message
-from models import Doctor, Appointment, Treatment, Patient
-from datetime import datetime
-import os
+from sqlalchemy import func
+from database import db, get_upsert_insert
+from models import Doctor, Appointment, Treatment, Patient, MonthlyReport
+from datetime import date, datetime, timedelta
+from smtplib import SMTPException
 import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+# recent appointments listed in each doctor's report
+REPORT_TOP_N = 10
+
+# first day of the month and of the next month for a 'YYYY-MM' period
+def _period_bounds(period):
+    first_day = datetime.strptime(period, '%Y-%m').date()
+    next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first_day, next_month
+
+# previous calendar month, the report runs on the 1st for the month that just ended
+def _previous_period(today=None):
+    today = today or date.today()
+    return (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+
+# compute every active doctor's report for a period and upsert it into monthly_reports
+# one windowed query gives counts and top-n appointments, one grouped query counts treatments
+def build_monthly_reports(period):
+    first_day, next_month = _period_bounds(period)
+
+    ranked = db.session.query(
+        Appointment.doctor_id.label('doctor_id'),
+        Appointment.appointment_date.label('appointment_date'),
+        Appointment.appointment_time.label('appointment_time'),
+        Patient.name.label('patient_name'),
+        func.row_number().over(
+            partition_by=Appointment.doctor_id,
+            order_by=(Appointment.appointment_date.desc(), Appointment.appointment_time.desc(), Appointment.id.desc())
+        ).label('rank'),
+        func.count(Appointment.id).over(partition_by=Appointment.doctor_id).label('total')
+    ).outerjoin(Patient, Appointment.patient_id == Patient.id).filter(
+        Appointment.appointment_date >= first_day,
+        Appointment.appointment_date < next_month,
+        Appointment.status == 'completed'
+    ).subquery()
+
+    reports = {}
+    for row in db.session.query(ranked).filter(ranked.c.rank <= REPORT_TOP_N).order_by(ranked.c.doctor_id, ranked.c.rank):
+        report = reports.setdefault(row.doctor_id, {'total_appointments': row.total, 'recent_appointments': []})
+        report['recent_appointments'].append({
+            'date': row.appointment_date.isoformat(),
+            'time': row.appointment_time.strftime('%H:%M'),
+            'patient_name': row.patient_name or 'N/A'
+        })
 
+    treatment_counts = dict(db.session.query(Appointment.doctor_id, func.count(Treatment.id)).join(
+        Treatment, Treatment.appointment_id == Appointment.id
+    ).filter(
+        Treatment.created_at >= datetime.combine(first_day, datetime.min.time()),
+        Treatment.created_at < datetime.combine(next_month, datetime.min.time())
+    ).group_by(Appointment.doctor_id).all())
+
+    doctor_ids = [doctor_id for (doctor_id,) in db.session.query(Doctor.id).filter_by(is_active=True).order_by(Doctor.id)]
+    if not doctor_ids:
+        return []
+
+    now = datetime.utcnow()
+    rows = [{
+        'doctor_id': doctor_id,
+        'period': period,
+        'total_appointments': reports.get(doctor_id, {}).get('total_appointments', 0),
+        'total_treatments': treatment_counts.get(doctor_id, 0),
+        'recent_appointments': reports.get(doctor_id, {}).get('recent_appointments', []),
+        'created_at': now,
+        'emailed_at': None
+    } for doctor_id in doctor_ids]
+
+    table = MonthlyReport.__table__
+    insert = get_upsert_insert(db.session.connection())
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['doctor_id', 'period'],
+        set_={column: stmt.excluded[column] for column in
+              ('total_appointments', 'total_treatments', 'recent_appointments', 'created_at', 'emailed_at')}
+    ).returning(table.c.id)
+    report_ids = [report_id for (report_id,) in db.session.execute(stmt)]
+    db.session.commit()
+    return report_ids
+
+# aggregate the month once, then render and send each doctor's email in parallel subtasks
 @celery.task
-def monthly_report():
+def monthly_report(period=None):
+    from app import app
+    with app.app_context():
+        period = period or _previous_period()
+        report_ids = build_monthly_reports(period)
+        if report_ids:
+            group(send_monthly_report.s(report_id) for report_id in report_ids).apply_async()
+        return f"Built {len(report_ids)} monthly reports for {period}, emails queued"
+
+# email one persisted report to its doctor
+@celery.task(bind=True, max_retries=3, default_retry_delay=60)
+def send_monthly_report(self, report_id):
     from app import app, mail
+    from serializers import load_options
     with app.app_context():
-        now = datetime.now()
-        first_day_current = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        last_day_current = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-        docs = Doctor.query.filter_by(is_active=True).all()
-        sent = 0
-        for doc in docs:
-            if not doc.user:
-                continue
-            appts = Appointment.query.filter(
-                Appointment.doctor_id == doc.id,
-                Appointment.appointment_date >= first_day_current.date(),
-                Appointment.appointment_date <= last_day_current.date(),
-                Appointment.status == 'completed'
-            ).all()
-            treatments = Treatment.query.join(Appointment).filter(
-                Appointment.doctor_id == doc.id,
-                Treatment.created_at >= first_day_current,
-                Treatment.created_at <= last_day_current
-            ).all()
-
-            # html report
-            content = f"""
-                <p><strong>Dr. {doc.name}</strong> - {doc.specialization}</p>
-                <p>Period: {first_day_current.strftime('%B %Y')}</p>
-                
-                <div style="background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <p style="margin: 5px 0;"><strong>Total Appointments:</strong> {len(appts)}</p>
-                    <p style="margin: 5px 0;"><strong>Total Treatments:</strong> {len(treatments)}</p>
-                </div>
-
-                <h3>Recent Appointments</h3>
-                <table>
-                    <tr>
-                        <th>Date</th>
-                        <th>Patient</th>
-                        <th>Time</th>
-                    </tr>"""
-            for a in appts[:10]:
-                pname = a.patient.name if a.patient else 'N/A'
-                content += f"<tr><td>{a.appointment_date}</td><td>{pname}</td><td>{a.appointment_time}</td></tr>"
-            content += "</table>"
-            
-            html = get_email_template("Monthly Activity Report", content)
-
-            doctor_email = doc.user.email
-            msg = Message(subject=f"Monthly Activity Report - {first_day_current.strftime('%B %Y')}", recipients=[doctor_email])
-            msg.html = html
+        report = MonthlyReport.query.options(*load_options(MonthlyReport, 'doctor.user')).get(report_id)
+        if not report or not report.doctor or not report.doctor.user:
+            return f"Report {report_id} has no doctor email"
+
+        doc = report.doctor
+        month_name = datetime.strptime(report.period, '%Y-%m').strftime('%B %Y')
+
+        html = render_email(
+            'monthly_report',
+            doctor_name=doc.name,
+            specialization=doc.specialization,
+            month_name=month_name,
+            total_appointments=report.total_appointments,
+            total_treatments=report.total_treatments,
+            recent_appointments=report.recent_appointments or []
+        )
+
+        msg = Message(subject=f"Monthly Activity Report - {month_name}", recipients=[doc.user.email])
+        msg.html = html
+        try:
             mail.send(msg)
-            sent += 1
-        return f"Sent {sent} monthly reports for {first_day_current.strftime('%B %Y')}"
+        except (SMTPException, OSError) as e:
+            raise self.retry(exc=e)
 
-@celery.task
-def patient_history_export(patient_id):
+        report.emailed_at = datetime.utcnow()
+        db.session.commit()
+        return f"Sent monthly report {report.period} to Doctor {doc.id}"
+
+# history exports: where files are kept, for how long, and when they are compressed
+EXPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
+EXPORT_RETENTION_HOURS = int(os.getenv('EXPORT_RETENTION_HOURS', 24))
+EXPORT_SPOOL_BYTES = int(os.getenv('EXPORT_SPOOL_BYTES', 1024 * 1024))
+EXPORT_GZIP_BYTES = int(os.getenv('EXPORT_GZIP_BYTES', 256 * 1024))
+EXPORT_MAX_ATTACHMENT_BYTES = int(os.getenv('EXPORT_MAX_ATTACHMENT_BYTES', 10 * 1024 * 1024))
+EXPORT_YIELD_PER = 500
+
+# delete exports older than the retention window, returns the number removed
+def cleanup_exports(max_age_hours=EXPORT_RETENTION_HOURS):
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for entry in os.scandir(EXPORTS_DIR):
+        if entry.is_file() and not entry.name.startswith('.') and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+# one row per treatment with the columns the csv needs, streamed in batches (no orm objects or lazy loads)
+def _history_rows(patient_id):
+    return db.session.query(
+        Appointment.appointment_date,
+        Doctor.name,
+        Treatment.visit_type,
+        Treatment.diagnosis,
+        Treatment.prescription,
+        Treatment.treatment_notes
+    ).select_from(Treatment).join(
+        Appointment, Treatment.appointment_id == Appointment.id
+    ).outerjoin(
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).filter(
+        Appointment.patient_id == patient_id
+    ).order_by(Treatment.created_at.desc(), Treatment.id.desc()).yield_per(EXPORT_YIELD_PER)
+
+# write the csv into a spooled temp file (memory up to EXPORT_SPOOL_BYTES, then disk), returns (file, rows)
+# progress(rows) is called every EXPORT_YIELD_PER rows
+def _spool_history_csv(patient_id, progress=None):
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode='w+b')
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(['Sr. No', 'Date', 'Doctor', 'Visit Type', 'Diagnosis', 'Medicines', 'Treatment Notes'])
+    rows = 0
+    for appt_date, doctor_name, visit_type, diagnosis, prescription, notes in _history_rows(patient_id):
+        rows += 1
+        writer.writerow([
+            rows,
+            str(appt_date) if appt_date else 'N/A',
+            doctor_name or 'N/A',
+            visit_type or 'General',
+            diagnosis or 'N/A',
+            prescription or 'N/A',
+            notes or 'N/A'
+        ])
+        if progress and rows % EXPORT_YIELD_PER == 0:
+            progress(rows)
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool, rows
+
+# copy the spooled csv into exports/, gzip-compressed when large; returns (filename, path)
+def _save_export(spool, basename):
+    spool.seek(0, os.SEEK_END)
+    size = spool.tell()
+    spool.seek(0)
+    compress = size > EXPORT_GZIP_BYTES
+    filename = basename + ('.csv.gz' if compress else '.csv')
+    filepath = os.path.join(EXPORTS_DIR, filename)
+    with (gzip.open(filepath, 'wb') if compress else open(filepath, 'wb')) as out:
+        shutil.copyfileobj(spool, out)
+    return filename, filepath
+
+# task ids of history exports carry the patient id so status checks can verify ownership
+def export_task_id(patient_id):
+    return f"history-export-{patient_id}-{uuid.uuid4().hex}"
+
+def export_task_owner(task_id):
+    parts = task_id.split('-')
+    if len(parts) != 4 or parts[:2] != ['history', 'export'] or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+# stream a patient's treatment history to csv (gzip when large), keep it in exports/ and email it
+# reports PROGRESS state with rows written; the result says where the file is
+@celery.task(bind=True)
+def patient_history_export(self, patient_id):
     from app import app, mail
+    from serializers import with_relations
     with app.app_context():
-        patient = Patient.query.get(patient_id)
+        patient = with_relations(Patient.query, Patient).filter_by(id=patient_id).first()
         if not patient or not patient.user:
-            return f"Patient {patient_id} not found or has no user account"
+            raise ValueError(f"Patient {patient_id} not found or has no user account")
 
-        treatments = Treatment.query.join(Appointment).filter(
-            Appointment.patient_id == patient_id
-        ).order_by(Treatment.created_at.desc()).all()
+        def progress(rows):
+            self.update_state(state='PROGRESS', meta={'patient_id': patient_id, 'stage': 'writing', 'rows': rows})
+
+        progress(0)
+        os.makedirs(EXPORTS_DIR, exist_ok=True)
+        cleanup_exports()
 
-        # Use absolute path relative to backend root or a specific exports folder
-        # Assuming backend/exports exists or should be created
-        exports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
-        os.makedirs(exports_dir, exist_ok=True)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"patient_{patient_id}_history_{timestamp}.csv"
-        filepath = os.path.join(exports_dir, filename)
-
-        # write csv file
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Sr. No', 'Date', 'Doctor', 'Visit Type', 'Diagnosis', 'Medicines', 'Treatment Notes'])
-            for idx, t in enumerate(treatments, 1):
-                doctor_name = t.appointment.doctor.name if t.appointment and t.appointment.doctor else 'N/A'
-                appt_date = str(t.appointment.appointment_date) if t.appointment else 'N/A'
-                visit_type = t.visit_type or 'General'
-                diagnosis = t.diagnosis or 'N/A'
-                medicines = t.prescription or 'N/A'
-                notes = t.treatment_notes or 'N/A'
-                writer.writerow([idx, appt_date, doctor_name, visit_type, diagnosis, medicines, notes])
-
-        # send email with attachment
+        spool, rows = _spool_history_csv(patient_id, progress)
+        self.update_state(state='PROGRESS', meta={'patient_id': patient_id, 'stage': 'emailing', 'rows': rows})
+        with spool:
+            filename, filepath = _save_export(spool, f"patient_{patient_id}_history_{timestamp}")
+
+        # send email with attachment (very large exports are only kept for download)
         patient_email = patient.user.email
+        size = os.path.getsize(filepath)
+        attach = size <= EXPORT_MAX_ATTACHMENT_BYTES
         
-        content = f"""
-            <p>Hi {patient.name},</p>
-            <p>Your medical history export has been generated successfully.</p>
-            <p>Please find the attached CSV file containing your complete medical records.</p>
-            <p>If you did not request this export, please contact support immediately.</p>
-        """
-        html = get_email_template("Medical History Export", content)
+        html = render_email('history_export', patient_name=patient.name, attached=attach)
         
         msg = Message(subject='Your Medical History Export is Ready', recipients=[patient_email])
         msg.html = html
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        msg.attach(filename, 'text/csv', content)
-        mail.send(msg)
-        return f"Exported {len(treatments)} records to {filename} and emailed to {patient_email}"
+        if attach:
+            with open(filepath, 'rb') as f:
+                msg.attach(filename, 'application/gzip' if filename.endswith('.gz') else 'text/csv', f.read())
+        result = {
+            'patient_id': patient_id,
+            'rows': rows,
+            'filename': filename,
+            'size': size,
+            'compressed': filename.endswith('.gz'),
+            'attached': attach,
+            'emailed_to': patient_email,
+            'emailed': True
+        }
+        # the file is already saved, a mail outage must not fail the export (it stays downloadable)
+        try:
+            mail.send(msg)
+        except (SMTPException, OSError) as e:
+            result['emailed'] = False
+            result['email_error'] = str(e)
+        return result
@@ -0,0 +1,175 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import event, func, select, inspect
+from sqlalchemy.orm import Session
+from database import db, get_upsert_insert
+from models import Appointment, Counter, Doctor, Patient
+
+# appointment statuses counted as "appointments" on the dashboards (open slots are not)
+COUNTED_STATUSES = ('booked', 'cancelled', 'completed')
+
+# appointment columns that affect counters
+TRACKED = ('doctor_id', 'patient_id', 'appointment_date', 'status')
+
+# counter deltas contributed by one appointment in the given state
+def _contributions(state, sign=1):
+    deltas = defaultdict(int)
+    doctor_id = state['doctor_id']
+    patient_id = state['patient_id']
+    day = state['appointment_date'].isoformat()
+    status = state['status'] or 'available'
+
+    if status in COUNTED_STATUSES:
+        deltas['appointments'] += sign
+        deltas[f'doctor:{doctor_id}:appointments'] += sign
+    deltas[f'doctor:{doctor_id}:day:{day}'] += sign
+
+    if patient_id is not None:
+        deltas[f'patient:{patient_id}:appointments'] += sign
+        # pair counts drive the distinct doctor/patient counters
+        deltas[f'pair:{doctor_id}:{patient_id}'] += sign
+        if status == 'booked':
+            deltas[f'patient:{patient_id}:booked:{day}'] += sign
+    return deltas
+
+# apply counter deltas on the current transaction's connection
+def apply_deltas(connection, deltas):
+    insert = get_upsert_insert(connection)
+    for key, delta in sorted(deltas.items()):
+        if delta == 0:
+            continue
+        stmt = insert(Counter.__table__).values(key=key, value=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'value': Counter.__table__.c.value + delta}
+        ).returning(Counter.__table__.c.value)
+        new_value = connection.execute(stmt).scalar()
+
+        # a doctor/patient pair appearing or disappearing changes both distinct counts
+        if key.startswith('pair:') and (new_value - delta > 0) != (new_value > 0):
+            _, doctor_id, patient_id = key.split(':')
+            step = 1 if new_value > 0 else -1
+            apply_deltas(connection, {
+                f'doctor:{doctor_id}:patients': step,
+                f'patient:{patient_id}:doctors': step
+            })
+
+# record an appointment moving from old state to new state (either may be None)
+def record_appointment_change(connection, old, new):
+    deltas = defaultdict(int)
+    if old is not None:
+        for key, delta in _contributions(old, -1).items():
+            deltas[key] += delta
+    if new is not None:
+        for key, delta in _contributions(new).items():
+            deltas[key] += delta
+    apply_deltas(connection, deltas)
+
+def _current_state(obj):
+    return {attr: getattr(obj, attr) for attr in TRACKED}
+
+# keep counters in step with ORM writes, inside the same transaction as the flush
+@event.listens_for(Session, 'before_flush')
+def _track_changes(session, flush_context, instances):
+    connection = None
+    deltas = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            for key, delta in _contributions(_current_state(obj)).items():
+                deltas[key] += delta
+        elif isinstance(obj, Doctor):
+            deltas['doctors'] += 1
+        elif isinstance(obj, Patient):
+            deltas['patients'] += 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Appointment):
+            continue
+        state = inspect(obj)
+        changed = [attr for attr in TRACKED if state.attrs[attr].history.has_changes()]
+        if not changed:
+            continue
+        if connection is None:
+            connection = session.connection()
+        table = Appointment.__table__
+        row = connection.execute(
+            select(*[table.c[attr] for attr in TRACKED]).where(table.c.id == obj.id)
+        ).mappings().first()
+        if row is None:
+            continue
+        old = dict(row)
+        new = dict(old)
+        for attr in changed:
+            new[attr] = getattr(obj, attr)
+        for key, delta in _contributions(old, -1).items():
+            deltas[key] += delta
+        for key, delta in _contributions(new).items():
+            deltas[key] += delta
+
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            for key, delta in _contributions(_current_state(obj), -1).items():
+                deltas[key] += delta
+        elif isinstance(obj, Doctor):
+            deltas['doctors'] -= 1
+        elif isinstance(obj, Patient):
+            deltas['patients'] -= 1
+
+    if any(deltas.values()):
+        if connection is None:
+            connection = session.connection()
+        apply_deltas(connection, deltas)
+
+# read several counters in one query, missing keys are 0
+def get_counters(*keys):
+    rows = db.session.query(Counter.key, Counter.value).filter(Counter.key.in_(keys)).all()
+    values = dict(rows)
+    return {key: values.get(key, 0) for key in keys}
+
+# booked appointments of a patient from a date onwards (sums the per-day counters)
+def get_patient_upcoming(patient_id, from_date=None):
+    from_date = from_date or date.today()
+    prefix = f'patient:{patient_id}:booked:'
+    total = db.session.query(func.coalesce(func.sum(Counter.value), 0)).filter(
+        Counter.key >= prefix + from_date.isoformat(),
+        Counter.key < prefix[:-1] + ';'
+    ).scalar()
+    return int(total)
+
+# rebuild every counter from the source tables (reconcile after manual edits or upgrades)
+def rebuild_counters():
+    values = defaultdict(int)
+    values['doctors'] = Doctor.query.count()
+    values['patients'] = Patient.query.count()
+
+    rows = db.session.query(
+        Appointment.doctor_id,
+        Appointment.patient_id,
+        Appointment.appointment_date,
+        Appointment.status,
+        func.count(Appointment.id)
+    ).group_by(
+        Appointment.doctor_id,
+        Appointment.patient_id,
+        Appointment.appointment_date,
+        Appointment.status
+    ).all()
+
+    for doctor_id, patient_id, day, status, count in rows:
+        state = {'doctor_id': doctor_id, 'patient_id': patient_id, 'appointment_date': day, 'status': status}
+        for key, delta in _contributions(state).items():
+            values[key] += delta * count
+
+    for key in list(values):
+        if key.startswith('pair:') and values[key] > 0:
+            _, doctor_id, patient_id = key.split(':')
+            values[f'doctor:{doctor_id}:patients'] += 1
+            values[f'patient:{patient_id}:doctors'] += 1
+
+    Counter.query.delete()
+    db.session.bulk_insert_mappings(Counter, [
+        {'key': key, 'value': value} for key, value in values.items() if value
+    ])
+    db.session.commit()
+    return len(values)
@@ -1,2 +1,57 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import os
+import sqlite3
+
 db = SQLAlchemy()
+
+DEFAULT_DATABASE_URL = 'sqlite:///medihub-database.db'
+
+# sqlite lock wait in milliseconds before "database is locked" is raised
+SQLITE_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', 5000))
+
+# database url from env, accepts the legacy postgres:// scheme too
+def get_database_url():
+    url = os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL)
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+# engine/pool options from env (in-memory sqlite keeps its single shared connection)
+def get_engine_options(url):
+    if url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///') or ':memory:' in url):
+        return {}
+
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True') == 'True'
+    }
+    if url.startswith('sqlite'):
+        # connections are shared between request threads, sqlite serializes writes itself
+        options['connect_args'] = {'check_same_thread': False, 'timeout': SQLITE_BUSY_TIMEOUT / 1000}
+    return options
+
+# dialect specific insert() that supports on_conflict_do_update (sqlite and postgres)
+def get_upsert_insert(bind):
+    if bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif bind.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'upsert not supported on {bind.dialect.name}')
+    return insert
+
+# sqlite pragmas on every new connection: WAL lets readers run alongside the writer
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
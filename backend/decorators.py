@@ -1,6 +1,42 @@
+from collections import OrderedDict
 from functools import wraps
-from flask import jsonify
+from threading import Lock
+from flask import jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from queries import profile_id_query
+from models import Doctor, Patient
+import time
+
+# (model, user id) -> (profile id, expiry) for tokens issued without the profile_id claim,
+# least recently used entries dropped beyond PROFILE_CACHE_SIZE
+PROFILE_CACHE_TTL = 300
+PROFILE_CACHE_SIZE = 10000
+_profile_cache = OrderedDict()
+_profile_cache_lock = Lock()
+
+# resolve doctor/patient id once per request: jwt claim first, then ttl cache, then one query
+def _resolve_profile_id(model):
+    profile_id = get_jwt().get('profile_id')
+    if profile_id is not None:
+        return profile_id
+    
+    key = (model.__name__, get_current_user_id())
+    with _profile_cache_lock:
+        cached = _profile_cache.get(key)
+        if cached and cached[1] > time.time():
+            _profile_cache.move_to_end(key)
+            return cached[0]
+    
+    row = profile_id_query(model, key[1]).first()
+    if row is None:
+        return None
+    
+    with _profile_cache_lock:
+        _profile_cache[key] = (row.id, time.time() + PROFILE_CACHE_TTL)
+        _profile_cache.move_to_end(key)
+        while len(_profile_cache) > PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+    return row.id
 
 # simple jwt decorator that checks if user is logged in
 def login_required(f):
@@ -29,6 +65,9 @@ def doctor_required(f):
         claims = get_jwt()
         if claims.get('role') != 'doctor':
             return jsonify({'success': False, 'message': 'Doctor access only'}), 403
+        g.doctor_id = _resolve_profile_id(Doctor)
+        if g.doctor_id is None:
+            return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
         return f(*args, **kwargs)
     return wrapper
 
@@ -40,6 +79,9 @@ def patient_required(f):
         claims = get_jwt()
         if claims.get('role') != 'patient':
             return jsonify({'success': False, 'message': 'Patient access only'}), 403
+        g.patient_id = _resolve_profile_id(Patient)
+        if g.patient_id is None:
+            return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
         return f(*args, **kwargs)
     return wrapper
 
@@ -62,3 +104,11 @@ def get_current_user_id():
 def get_current_user_role():
     claims = get_jwt()
     return claims.get('role')
+
+# helper function to get current doctor profile id (set by doctor_required)
+def get_current_doctor_id():
+    return g.doctor_id
+
+# helper function to get current patient profile id (set by patient_required)
+def get_current_patient_id():
+    return g.patient_id
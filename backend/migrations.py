@@ -0,0 +1,108 @@
+import sys
+from datetime import date, datetime, timedelta
+from sqlalchemy import inspect
+from database import db
+from models import Doctor, Patient, Treatment
+
+# bring an existing database up to the current model schema
+# create_all only adds missing tables, so nullable columns and indexes declared later on existing tables are created here
+def migrate():
+    from counters import rebuild_counters
+    from search import ensure_search_index
+
+    had_counters = inspect(db.engine).has_table('counters')
+    db.create_all()
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        # nullable columns added to an existing table later (e.g. outbox_messages.digest_key)
+        columns = set(c['name'] for c in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in columns and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                created.append(f'{table.name}.{column.name}')
+
+        existing = set(ix['name'] for ix in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+
+    # full-text search tables live outside the model metadata
+    created += ensure_search_index()
+
+    # backfill dashboard counters when upgrading a database that predates them
+    if not had_counters:
+        rebuild_counters()
+    return created
+
+# the hot endpoint and task queries, built by the same functions the routes and tasks run
+def _hot_queries():
+    from availability import exceptions_query, templates_query
+    from outbox import due_digest_keys_query, due_ids_query
+    from pagination import APPOINTMENT_SORT, sort_order
+    from queries import (active_doctors_query, doctor_appointments_query, monthly_reports_query,
+                         patient_appointments_query, patient_history_query, profile_id_query, reminder_ids_query)
+    from slots import booked_slots_query
+
+    today = date.today()
+    week = today + timedelta(days=7)
+    now = datetime.utcnow()
+    return {
+        'doctor appointments (upcoming)': doctor_appointments_query(1, 'upcoming'),
+        'doctor appointments (last 30 days)': doctor_appointments_query(1),
+        'patient appointments by status': patient_appointments_query(1, 'booked').order_by(*sort_order(APPOINTMENT_SORT)),
+        'patient history': patient_history_query(1),
+        'daily reminders': reminder_ids_query(today),
+        'slot grid appointments': booked_slots_query([1, 2], today, week),
+        'availability exceptions': exceptions_query([1, 2], today, week),
+        'availability templates': templates_query([1, 2]),
+        'doctor profile by user': profile_id_query(Doctor, 1),
+        'patient profile by user': profile_id_query(Patient, 1),
+        'active doctors by specialization': active_doctors_query('Cardiology'),
+        'monthly reports by period': monthly_reports_query('2025-01'),
+        'outbox due messages': due_ids_query(now),
+        'outbox due digests': due_digest_keys_query(now),
+        # what the selectin load of Appointment.treatments emits for a page of appointments
+        'treatments by appointment': Treatment.query.filter(Treatment.appointment_id.in_([1, 2]))
+    }
+
+# full scans accepted on purpose, (query name, plan detail)
+QUERY_PLAN_ALLOWLIST = set()
+
+def _statement(query):
+    return query.statement if hasattr(query, 'statement') else query
+
+# run EXPLAIN QUERY PLAN on the hot queries, return those with a SCAN step (a full table scan, or a full
+# walk of an index or covering index) that is not in QUERY_PLAN_ALLOWLIST
+def check_query_plans():
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    failures = []
+    connection = db.session.connection()
+    for name, query in _hot_queries().items():
+        sql = str(_statement(query).compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        details = [row[-1] for row in plan]
+        if any(d.startswith('SCAN ') and (name, d) not in QUERY_PLAN_ALLOWLIST for d in details):
+            failures.append((name, details))
+    return failures
+
+# python migrations.py         -> apply schema changes
+# python migrations.py check   -> apply, then fail if a hot query does a full table scan
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        created = migrate()
+        print(f"✓ schema up to date ({len(created)} columns/indexes/search tables created)")
+
+        if len(sys.argv) > 1 and sys.argv[1] == 'check':
+            failures = check_query_plans()
+            for name, details in failures:
+                print(f"✗ {name}: {'; '.join(details)}")
+            if failures:
+                sys.exit(1)
+            print("✓ no hot query scans a table or a whole index")
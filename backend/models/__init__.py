@@ -1,15 +1,24 @@
 # import all models
 from .user import User
 from .patient import Patient  
-from .doctor import Doctor, DoctorAvailability
+from .doctor import Doctor, DoctorAvailability, AvailabilityTemplate
 from .appointment import Appointment
 from .treatment import Treatment
+from .counter import Counter
+from .report import MonthlyReport
+from .outbox import OutboxMessage
+from .autocomplete import AutocompleteChange
 
 __all__ = [
     'User',
     'Patient', 
     'Doctor',
     'DoctorAvailability',
+    'AvailabilityTemplate',
     'Appointment',
-    'Treatment'
+    'Treatment',
+    'Counter',
+    'MonthlyReport',
+    'OutboxMessage',
+    'AutocompleteChange'
 ]
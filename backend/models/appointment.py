@@ -16,12 +16,19 @@ class Appointment(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('doctor_id', 'appointment_date', 'appointment_time', name='unique_doctor_slot'),
+        db.Index('ix_appointments_doctor_date_status', 'doctor_id', 'appointment_date', 'status'),
+        db.Index('ix_appointments_patient_date_status', 'patient_id', 'appointment_date', 'status'),
+        db.Index('ix_appointments_date_status', 'appointment_date', 'status'),
     )
     
     # relationships
     treatments = db.relationship('Treatment', backref='appointment', lazy=True)
     
-    def to_dict(self):
+    # include limits which related sections are serialized (default: all)
+    def to_dict(self, include=None):
+        if include is None:
+            include = ('patient', 'doctor', 'treatments')
+        
         data = {
             'id': self.id,
             'patient_id': self.patient_id,
@@ -35,7 +42,7 @@ class Appointment(db.Model):
         }
         
         # add patient info if exists
-        if self.patient:
+        if 'patient' in include and self.patient:
             data['patient_name'] = self.patient.name
             data['patient_phone'] = self.patient.phone
             data['patient'] = {
@@ -49,7 +56,7 @@ class Appointment(db.Model):
             }
             
         # add doctor info if exists
-        if self.doctor:
+        if 'doctor' in include and self.doctor:
             data['doctor_name'] = self.doctor.name
             data['doctor_specialization'] = self.doctor.specialization
             data['consultation_fee'] = self.doctor.consultation_fee
@@ -63,7 +70,7 @@ class Appointment(db.Model):
             }
         
         # add treatment if exists
-        if self.treatments and len(self.treatments) > 0:
+        if 'treatments' in include and self.treatments and len(self.treatments) > 0:
             treatment = self.treatments[0]
             data['treatment'] = {
                 'id': treatment.id,
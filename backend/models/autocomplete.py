@@ -0,0 +1,15 @@
+from datetime import datetime
+from database import db
+
+class AutocompleteChange(db.Model):
+    __tablename__ = 'autocomplete_changes'
+    
+    # written in the same transaction as the doctor/patient change; every process replays
+    # new rows into its own typeahead index
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'doctors' or 'patients'
+    entity_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<AutocompleteChange {self.id} {self.kind}:{self.entity_id}>'
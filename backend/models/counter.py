@@ -0,0 +1,11 @@
+from database import db
+
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    
+    # e.g. 'doctors', 'doctor:3:appointments', 'patient:7:booked:2025-01-31'
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<Counter {self.key}={self.value}>'
@@ -1,11 +1,12 @@
 from datetime import datetime
+import calendar
 from database import db
 
 class Doctor(db.Model):
     __tablename__ = 'doctors'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     specialization = db.Column(db.String(100), nullable=False)
     experience = db.Column(db.Integer)
@@ -15,11 +16,20 @@ class Doctor(db.Model):
     consultation_fee = db.Column(db.Float, default=0.0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_doctors_active_specialization', 'is_active', 'specialization'),
+    )
+    
     # relationships
     appointments = db.relationship('Appointment', backref='doctor', lazy=True)
     availability = db.relationship('DoctorAvailability', backref='doctor', lazy=True, cascade='all, delete-orphan')
+    availability_templates = db.relationship('AvailabilityTemplate', backref='doctor', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    # include limits which related sections are serialized (default: all)
+    def to_dict(self, include=None):
+        if include is None:
+            include = ('user',)
+        
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -31,7 +41,7 @@ class Doctor(db.Model):
             'is_active': self.is_active,
             'consultation_fee': self.consultation_fee,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'user': self.user.to_dict() if self.user else None
+            'user': self.user.to_dict() if 'user' in include and self.user else None
         }
     
     def __repr__(self):
@@ -49,6 +59,7 @@ class DoctorAvailability(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('doctor_id', 'availability_date', 'slot_type', name='unique_doctor_date_slot'),
+        db.Index('ix_availability_doctor_date_slot_available', 'doctor_id', 'availability_date', 'slot_type', 'is_available'),
     )
     
     def to_dict(self):
@@ -63,3 +74,32 @@ class DoctorAvailability(db.Model):
     
     def __repr__(self):
         return f'<Availability {self.doctor_id} {self.availability_date} {self.slot_type}>'
+
+# weekly recurring availability (e.g. every monday morning); DoctorAvailability rows are per-date exceptions
+class AvailabilityTemplate(db.Model):
+    __tablename__ = 'availability_templates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = monday ... 6 = sunday
+    slot_type = db.Column(db.String(20), nullable=False)
+    is_available = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'weekday', 'slot_type', name='unique_doctor_weekday_slot'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'doctor_id': self.doctor_id,
+            'weekday': self.weekday,
+            'day_name': calendar.day_name[self.weekday],
+            'slot_type': self.slot_type,
+            'is_available': self.is_available,
+            'time_range': '9:00 AM - 1:00 PM' if self.slot_type == 'morning' else '3:00 PM - 7:00 PM'
+        }
+    
+    def __repr__(self):
+        return f'<AvailabilityTemplate {self.doctor_id} {self.weekday} {self.slot_type}>'
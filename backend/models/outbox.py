@@ -0,0 +1,27 @@
+from datetime import datetime
+from database import db
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'outbox_messages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # e.g. 'booking_confirmation_patient'
+    payload = db.Column(db.JSON, nullable=False)
+    digest_key = db.Column(db.String(50))  # e.g. 'doctor:3', batched into one digest email per key
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, dispatching, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_outbox_status_available', 'status', 'available_at'),
+        db.Index('ix_outbox_claim_token', 'claim_token'),
+        db.Index('ix_outbox_digest_status', 'digest_key', 'status'),
+    )
+    
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.kind} {self.status}>'
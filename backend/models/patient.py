@@ -5,7 +5,7 @@ class Patient(db.Model):
     __tablename__ = 'patients'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
@@ -19,7 +19,11 @@ class Patient(db.Model):
     # relationships
     appointments = db.relationship('Appointment', backref='patient', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    # include limits which related sections are serialized (default: all)
+    def to_dict(self, include=None):
+        if include is None:
+            include = ('user',)
+        
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -32,7 +36,7 @@ class Patient(db.Model):
             'emergency_contact': self.emergency_contact,
             'is_blacklisted': self.is_blacklisted,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'user': self.user.to_dict() if self.user else None
+            'user': self.user.to_dict() if 'user' in include and self.user else None
         }
     
     def __repr__(self):
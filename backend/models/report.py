@@ -0,0 +1,38 @@
+from datetime import datetime
+from database import db
+
+class MonthlyReport(db.Model):
+    __tablename__ = 'monthly_reports'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    period = db.Column(db.String(7), nullable=False)  # 'YYYY-MM'
+    total_appointments = db.Column(db.Integer, nullable=False, default=0)
+    total_treatments = db.Column(db.Integer, nullable=False, default=0)
+    recent_appointments = db.Column(db.JSON)  # [{'date', 'time', 'patient_name'}], newest first
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    emailed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'period', name='unique_doctor_report_period'),
+        db.Index('ix_monthly_reports_period', 'period'),
+    )
+    
+    doctor = db.relationship('Doctor')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'doctor_id': self.doctor_id,
+            'doctor_name': self.doctor.name if self.doctor else None,
+            'specialization': self.doctor.specialization if self.doctor else None,
+            'period': self.period,
+            'total_appointments': self.total_appointments,
+            'total_treatments': self.total_treatments,
+            'recent_appointments': self.recent_appointments or [],
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'emailed_at': self.emailed_at.isoformat() if self.emailed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<MonthlyReport {self.doctor_id} {self.period}>'
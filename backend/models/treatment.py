@@ -5,7 +5,7 @@ class Treatment(db.Model):
     __tablename__ = 'treatments'
     
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False, index=True)
     diagnosis = db.Column(db.Text)
     prescription = db.Column(db.Text)
     visit_type = db.Column(db.String(50))
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import aliased
+import os
+import uuid
+from database import db
+from models import Appointment, Doctor, OutboxMessage, Patient, User
+
+# messages claimed per dispatch round, delivery attempts before giving up,
+# and how long a claim is held before another dispatcher may take it over (crashed worker)
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 300))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 7))
+
+# doctor-side notifications are buffered per doctor for this many minutes and sent as one digest (0 = send each)
+NOTIFICATION_DIGEST_MINUTES = int(os.getenv('NOTIFICATION_DIGEST_MINUTES', 0))
+
+# add a notification to the current transaction, it is only dispatched if the caller commits
+# messages with a digest_key wait for the digest flush instead of the regular dispatcher
+def enqueue(kind, digest_key=None, **payload):
+    if NOTIFICATION_DIGEST_MINUTES <= 0:
+        digest_key = None
+    message = OutboxMessage(kind=kind, payload=payload, digest_key=digest_key)
+    db.session.add(message)
+    return message
+
+# who and what an appointment email is about, read in the transaction of the event
+# (dates/times as strings so the snapshot is json); None if the appointment does not exist
+def appointment_details(appointment_id):
+    patient_user = aliased(User)
+    doctor_user = aliased(User)
+    row = db.session.query(
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Patient.name,
+        patient_user.email,
+        Doctor.name,
+        doctor_user.email
+    ).outerjoin(Patient, Patient.id == Appointment.patient_id).outerjoin(
+        patient_user, patient_user.id == Patient.user_id
+    ).join(Doctor, Doctor.id == Appointment.doctor_id).outerjoin(
+        doctor_user, doctor_user.id == Doctor.user_id
+    ).filter(Appointment.id == appointment_id).first()
+    if row is None:
+        return None
+
+    doctor_id, day, at, patient_name, patient_email, doctor_name, doctor_email = row
+    return {
+        'doctor_id': doctor_id,
+        'appointment_date': str(day),
+        'appointment_time': str(at),
+        'patient_name': patient_name,
+        'patient_email': patient_email,
+        'doctor_name': doctor_name,
+        'doctor_email': doctor_email
+    }
+
+# payload of one appointment notification: recipient and everything the email shows
+def appointment_payload(appointment_id, event, side, details):
+    return {
+        'appointment_id': appointment_id,
+        'event': event,
+        'recipient': details[f'{side}_email'],
+        'patient_name': details['patient_name'],
+        'doctor_name': details['doctor_name'],
+        'appointment_date': details['appointment_date'],
+        'appointment_time': details['appointment_time']
+    }
+
+# patient and doctor notifications for an appointment event ('confirmation' or 'cancellation')
+# the payload is a snapshot taken now: the row can be cancelled and rebooked by another patient
+# before dispatch, and the email must still go to (and describe) the people of this event
+def enqueue_appointment_notifications(appointment_id, event):
+    details = appointment_details(appointment_id)
+    if details is None:
+        return
+    enqueue(f'booking_{event}_patient', **appointment_payload(appointment_id, event, 'patient', details))
+    enqueue(
+        f'booking_{event}_doctor',
+        digest_key=f"doctor:{details['doctor_id']}",
+        **appointment_payload(appointment_id, event, 'doctor', details)
+    )
+
+def _due(now):
+    return or_(
+        and_(OutboxMessage.status == 'pending', OutboxMessage.available_at <= now),
+        and_(OutboxMessage.status == 'dispatching', OutboxMessage.claimed_at < now - timedelta(seconds=OUTBOX_LEASE_SECONDS))
+    )
+
+# ids of up to limit due non-digest messages, oldest first
+def due_ids_query(now, limit=OUTBOX_BATCH_SIZE):
+    due = and_(_due(now), OutboxMessage.digest_key.is_(None))
+    return select(OutboxMessage.id).where(due).order_by(OutboxMessage.id).limit(limit)
+
+# up to limit digest keys whose oldest due message has waited a full window
+def due_digest_keys_query(now, window_minutes=NOTIFICATION_DIGEST_MINUTES, limit=OUTBOX_BATCH_SIZE):
+    due = and_(_due(now), OutboxMessage.digest_key.isnot(None))
+    return select(OutboxMessage.digest_key).where(due).group_by(OutboxMessage.digest_key).having(
+        func.min(OutboxMessage.created_at) <= now - timedelta(minutes=window_minutes)
+    ).order_by(OutboxMessage.digest_key).limit(limit)
+
+# atomically claim up to limit due messages for this dispatcher and commit the claim
+# the conditional update only takes rows still pending (or with an expired lease), so two
+# dispatchers never get the same message
+def claim_batch(limit=OUTBOX_BATCH_SIZE):
+    now = datetime.utcnow()
+    due = and_(_due(now), OutboxMessage.digest_key.is_(None))
+    return _claim(OutboxMessage.id.in_(due_ids_query(now, limit).scalar_subquery()), due, now)
+
+# claim every due message of up to limit digest keys whose oldest message has waited a full window
+def claim_digests(window_minutes=NOTIFICATION_DIGEST_MINUTES, limit=OUTBOX_BATCH_SIZE):
+    now = datetime.utcnow()
+    due = and_(_due(now), OutboxMessage.digest_key.isnot(None))
+    keys = due_digest_keys_query(now, window_minutes, limit).scalar_subquery()
+    return _claim(OutboxMessage.digest_key.in_(keys), due, now)
+
+def _claim(selection, due, now):
+    token = uuid.uuid4().hex
+
+    db.session.execute(
+        update(OutboxMessage).where(selection, due).values(
+            status='dispatching',
+            claim_token=token,
+            claimed_at=now
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return OutboxMessage.query.filter_by(claim_token=token, status='dispatching').order_by(OutboxMessage.id).all()
+
+# record delivery outcomes of a claimed batch in one commit
+# failed messages are retried with backoff, dropped ones (nothing to send) are not
+def finish_batch(sent, failed, dropped=()):
+    now = datetime.utcnow()
+    for message in sent:
+        message.status = 'sent'
+        message.sent_at = now
+        message.attempts += 1
+        message.last_error = None
+    for message, error in failed:
+        message.attempts += 1
+        message.last_error = str(error)[:1000]
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            message.status = 'failed'
+        else:
+            # exponential backoff: 30s, 1m, 2m, 4m ...
+            message.status = 'pending'
+            message.available_at = now + timedelta(seconds=30 * 2 ** (message.attempts - 1))
+    for message, reason in dropped:
+        message.status = 'failed'
+        message.attempts += 1
+        message.last_error = reason
+    db.session.commit()
+
+# delete delivered messages past the retention window
+def purge_sent(days=OUTBOX_RETENTION_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = OutboxMessage.query.filter(
+        OutboxMessage.status == 'sent',
+        OutboxMessage.sent_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+# queue sizes per status, for monitoring
+def outbox_stats():
+    rows = db.session.query(OutboxMessage.status, db.func.count(OutboxMessage.id)).group_by(OutboxMessage.status).all()
+    stats = {'pending': 0, 'dispatching': 0, 'sent': 0, 'failed': 0}
+    stats.update(dict(rows))
+    stats['digest_pending'] = OutboxMessage.query.filter(
+        OutboxMessage.status == 'pending',
+        OutboxMessage.digest_key.isnot(None)
+    ).count()
+    stats['digest_minutes'] = NOTIFICATION_DIGEST_MINUTES
+    return stats
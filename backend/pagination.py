@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import date, time, datetime
+from sqlalchemy import and_, or_
+from models import Appointment, Doctor, Patient
+from serializers import parse_fields, relations_for, serialize, with_relations
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# stable sort keys per listing: (column, descending), last column must be unique
+APPOINTMENT_SORT = (
+    (Appointment.appointment_date, True),
+    (Appointment.appointment_time, True),
+    (Appointment.id, True)
+)
+DOCTOR_SORT = ((Doctor.id, False),)
+PATIENT_SORT = ((Patient.id, False),)
+
+def _encode_value(value):
+    if isinstance(value, (date, time, datetime)):
+        return value.isoformat()
+    return value
+
+def _decode_value(column, raw):
+    python_type = column.type.python_type
+    if python_type in (date, time, datetime):
+        return python_type.fromisoformat(raw)
+    return python_type(raw)
+
+def encode_cursor(obj, sort):
+    values = [_encode_value(getattr(obj, column.key)) for column, _ in sort]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, sort):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if len(values) != len(sort):
+            raise ValueError('cursor length mismatch')
+        return [_decode_value(column, raw) for (column, _), raw in zip(sort, values)]
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+# rows strictly after the cursor position: (a > x) or (a = x and b > y) or ...
+def _after(sort, values):
+    clauses = []
+    for i, (column, descending) in enumerate(sort):
+        equal = [c == v for (c, _), v in zip(sort[:i], values[:i])]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+# order_by clauses of a sort spec
+def sort_order(sort):
+    return [column.desc() if descending else column.asc() for column, descending in sort]
+
+# run a list query with optional ?fields= projection and ?limit=/?cursor= keyset pagination
+# returns (rows, page_info); page_info is empty when the client did not ask for a page
+# raises ValueError for bad limit/cursor values
+def list_page(query, model, sort, args):
+    fields = parse_fields(args.get('fields'))
+    relations = relations_for(model, fields)
+    if relations:
+        query = with_relations(query, model, *relations)
+
+    query = query.order_by(*sort_order(sort))
+
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return [serialize(obj, fields) for obj in query.all()], {}
+
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    if cursor:
+        query = query.filter(_after(sort, decode_cursor(cursor, sort)))
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = {
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1], sort) if has_more else None,
+        'limit': limit
+    }
+    return [serialize(obj, fields) for obj in rows], page
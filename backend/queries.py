@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+from database import db
+from models import Appointment, Doctor, MonthlyReport
+from serializers import with_relations
+
+# list queries shared by the routes/tasks that run them and by migrations.check_query_plans,
+# so the plan check explains exactly what production executes
+
+# doctor's appointment list: time_filter 'today', 'upcoming', 'completed' or the last 30 days by default
+def doctor_appointments_query(doctor_id, time_filter=None, on_date=None, status=None):
+    query = with_relations(Appointment.query, Appointment).filter_by(doctor_id=doctor_id)
+    query = query.filter(Appointment.status.in_(['booked', 'canceled', 'cancelled', 'completed']))
+
+    if time_filter == 'today':
+        query = query.filter_by(appointment_date=date.today())
+    elif time_filter == 'upcoming':
+        query = query.filter(Appointment.appointment_date >= date.today())
+        query = query.filter(Appointment.status.in_(['booked']))
+    elif time_filter == 'completed':
+        query = query.filter(Appointment.status == 'completed')
+    else:
+        query = query.filter(Appointment.appointment_date >= date.today() - timedelta(days=30))
+
+    if on_date:
+        query = query.filter_by(appointment_date=on_date)
+
+    if status:
+        query = query.filter_by(status=status)
+
+    return query.order_by(Appointment.appointment_date.asc(), Appointment.appointment_time.asc())
+
+# patient's own appointments (ordered and paged by list_page)
+def patient_appointments_query(patient_id, status=None):
+    query = Appointment.query.filter_by(patient_id=patient_id)
+    if status:
+        query = query.filter_by(status=status)
+    return query
+
+# one patient's visits with doctor and treatments, newest first
+def patient_history_query(patient_id):
+    return with_relations(Appointment.query, Appointment, 'doctor', 'treatments').filter_by(
+        patient_id=patient_id
+    ).filter(Appointment.status.in_(['booked', 'completed', 'cancelled', 'canceled'])).order_by(Appointment.appointment_date.desc())
+
+# bookable doctors, optionally of one department
+def active_doctors_query(specialization=None):
+    query = with_relations(Doctor.query, Doctor).filter_by(is_active=True)
+    if specialization:
+        query = query.filter(Doctor.specialization == specialization)
+    return query
+
+# one month's reports, busiest doctor first
+def monthly_reports_query(period):
+    return with_relations(MonthlyReport.query, MonthlyReport, 'doctor').filter_by(period=period).order_by(
+        MonthlyReport.total_appointments.desc(),
+        MonthlyReport.doctor_id
+    )
+
+# ids of the booked appointments of a day, for the reminder fan-out
+def reminder_ids_query(day):
+    return Appointment.query.with_entities(Appointment.id).filter_by(
+        appointment_date=day, status='booked'
+    ).order_by(Appointment.id)
+
+# doctor/patient profile id of a user
+def profile_id_query(model, user_id):
+    return db.session.query(model.id).filter_by(user_id=user_id)
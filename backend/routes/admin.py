@@ -1,58 +1,78 @@
 from flask import Blueprint, request, jsonify, current_app
 from database import db
-from models import User, Patient, Doctor, Appointment, Treatment
+from models import User, Patient, Doctor, Appointment, Treatment, MonthlyReport
 from werkzeug.security import generate_password_hash
 from datetime import datetime, date
 from sqlalchemy import or_
 from decorators import admin_required
+from slots import slot_cache
+from serializers import with_relations, invalidate_doctor
+from cache import cache
+from pagination import list_page, APPOINTMENT_SORT, DOCTOR_SORT, PATIENT_SORT
+from streaming import stream_list, STREAM_FORMATS
+from counters import get_counters
+from queries import monthly_reports_query
+from outbox import outbox_stats
+from search import search, load_ranked, parse_search_page, search_page_info
+from autocomplete import autocomplete, parse_autocomplete_limit, AUTOCOMPLETE_KINDS
 
 admin_bp = Blueprint('admin', __name__)
 
-# Simple in-memory cache for dashboard stats
-_stats_cache = {}
-
-# get admin dashboard stats with caching
+# get admin dashboard stats from incrementally maintained counters
 @admin_bp.route('/dashboard-stats', methods=['GET'])
 @admin_required
 def dashboard_stats():
-    from datetime import datetime, timedelta
-
-    cache_key = 'admin_stats'
-    # check cached data (5 min expiry)
-    if cache_key in _stats_cache:
-        cached_data, cached_time = _stats_cache[cache_key]
-        if (datetime.now() - cached_time).total_seconds() < 300:
-            return jsonify({'success': True, 'message': 'Dashboard stats retrieved (from cache)', 'data': cached_data})
-    
-    # fetch fresh data
-    total_doctors = Doctor.query.count()
-    total_patients = Patient.query.count()
-    total_appointments = Appointment.query.filter(
-        Appointment.status.in_(['booked', 'cancelled', 'completed'])
-    ).count()
+    values = get_counters('doctors', 'patients', 'appointments')
     
     stats = {
-        'total_doctors': total_doctors,
-        'total_patients': total_patients,
-        'total_appointments': total_appointments
+        'total_doctors': values['doctors'],
+        'total_patients': values['patients'],
+        'total_appointments': values['appointments']
     }
     
-    # save to cache
-    _stats_cache[cache_key] = (stats, datetime.now())
+    return jsonify({'success': True, 'message': 'Dashboard stats retrieved', 'data': stats})
+
+# get in-process cache counters for sizing
+@admin_bp.route('/cache-stats', methods=['GET'])
+@admin_required
+def cache_stats():
+    return jsonify({'success': True, 'message': 'Cache stats retrieved', 'data': {'slot_cache': slot_cache.stats(), 'app_cache': cache.stats(), 'autocomplete': autocomplete.stats()}})
+
+# get notification outbox queue sizes
+@admin_bp.route('/outbox-stats', methods=['GET'])
+@admin_required
+def get_outbox_stats():
+    return jsonify({'success': True, 'message': 'Outbox stats retrieved', 'data': outbox_stats()})
+
+# get persisted monthly reports (latest period by default, or ?period=YYYY-MM)
+@admin_bp.route('/monthly-reports', methods=['GET'])
+@admin_required
+def get_monthly_reports():
+    period = request.args.get('period')
+    
+    if period:
+        try:
+            datetime.strptime(period, '%Y-%m')
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid period', 'errors': ['Use period=YYYY-MM']}), 400
+    else:
+        period = db.session.query(db.func.max(MonthlyReport.period)).scalar()
+    
+    periods = [p for (p,) in db.session.query(MonthlyReport.period).distinct().order_by(MonthlyReport.period.desc())]
+    reports = monthly_reports_query(period).all() if period else []
     
-    return jsonify({'success': True, 'message': 'Dashboard stats retrieved (fresh)', 'data': stats})
+    return jsonify({'success': True, 'message': 'Monthly reports retrieved successfully', 'data': {'period': period, 'periods': periods, 'reports': [r.to_dict() for r in reports]}})
 
 # get all doctors list
 @admin_bp.route('/doctors', methods=['GET'])
 @admin_required
 def get_doctors():
-    doctors = Doctor.query.all()
-    data = []
-    
-    for doc in doctors:
-        data.append(doc.to_dict())
+    try:
+        data, page = list_page(Doctor.query, Doctor, DOCTOR_SORT, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
     
-    return jsonify({'success': True, 'message': 'Doctors retrieved successfully', 'data': {'doctors': data}})
+    return jsonify({'success': True, 'message': 'Doctors retrieved successfully', 'data': {'doctors': data, **page}})
 
 
 # create new doctor account
@@ -101,6 +121,7 @@ def add_doctor():
     )
     db.session.add(doctor)
     db.session.commit()
+    invalidate_doctor(doctor.id)
     
     return jsonify({'success': True, 'message': 'Doctor account created successfully', 'data': {'doctor': doctor.to_dict(), 'credentials': {'username': username, 'password': password}}})
 
@@ -136,6 +157,7 @@ def update_doctor(doctor_id):
         doctor.user.is_active = data['is_active']
     
     db.session.commit()
+    invalidate_doctor(doctor.id)
     
     return jsonify({'success': True, 'message': 'Doctor updated successfully', 'data': {'doctor': doctor.to_dict()}})
 
@@ -151,6 +173,7 @@ def delete_doctor(doctor_id):
     doctor.is_active = False
     doctor.user.is_active = False
     db.session.commit()
+    invalidate_doctor(doctor.id)
     
     return jsonify({'success': True, 'message': 'Doctor deactivated successfully', 'data': {}})
 
@@ -158,25 +181,35 @@ def delete_doctor(doctor_id):
 @admin_bp.route('/patients', methods=['GET'])
 @admin_required
 def get_patients():
-    patients = Patient.query.all()
-    data = []
-    
-    for p in patients:
-        data.append(p.to_dict())
-    
-    return jsonify({'success': True, 'message': 'Patients retrieved successfully', 'data': {'patients': data}})
+    fmt = request.args.get('format')
+    if fmt:
+        if fmt not in STREAM_FORMATS:
+            return jsonify({'success': False, 'message': 'Format must be ndjson or csv', 'errors': ['Invalid format']}), 400
+        return stream_list(Patient.query, Patient, PATIENT_SORT, request.args, 'patients')
+    
+    try:
+        data, page = list_page(Patient.query, Patient, PATIENT_SORT, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
+    
+    return jsonify({'success': True, 'message': 'Patients retrieved successfully', 'data': {'patients': data, **page}})
 
 # get all appointments list
 @admin_bp.route('/appointments', methods=['GET'])
 @admin_required
 def get_appointments():
-    appointments = Appointment.query.order_by(Appointment.appointment_date.desc()).all()
-    data = []
-    
-    for apt in appointments:
-        data.append(apt.to_dict())
-    
-    return jsonify({'success': True, 'message': 'Appointments retrieved successfully', 'data': {'appointments': data}})
+    fmt = request.args.get('format')
+    if fmt:
+        if fmt not in STREAM_FORMATS:
+            return jsonify({'success': False, 'message': 'Format must be ndjson or csv', 'errors': ['Invalid format']}), 400
+        return stream_list(Appointment.query, Appointment, APPOINTMENT_SORT, request.args, 'appointments')
+    
+    try:
+        data, page = list_page(Appointment.query, Appointment, APPOINTMENT_SORT, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
+    
+    return jsonify({'success': True, 'message': 'Appointments retrieved successfully', 'data': {'appointments': data, **page}})
 
 # update appointment status, notes, or reschedule
 @admin_bp.route('/appointments/<int:appointment_id>', methods=['PUT'])
@@ -189,6 +222,8 @@ def update_appointment(appointment_id):
     
     data = request.get_json()
     
+    old_slot = (appointment.doctor_id, appointment.appointment_date)
+    
     if 'status' in data:
         appointment.status = data['status']
     if 'notes' in data:
@@ -225,9 +260,13 @@ def update_appointment(appointment_id):
     
     db.session.commit()
     
+    # status or date may have moved, drop both days from slot cache
+    slot_cache.invalidate(*old_slot)
+    slot_cache.invalidate(appointment.doctor_id, appointment.appointment_date)
+    
     return jsonify({'success': True, 'message': 'Appointment updated successfully', 'data': {'appointment': appointment.to_dict()}})
 
-# search doctors by name or specialization
+# search doctors by name or specialization, ranked, prefix and typo tolerant (see search.py)
 @admin_bp.route('/search/doctors', methods=['GET'])
 @admin_required
 def search_doctors():
@@ -237,32 +276,38 @@ def search_doctors():
     if not q and not spec:
         return jsonify({'success': False, 'message': 'Search query or specialization is required', 'errors': ['Missing search parameters']}), 400
     
-    query = Doctor.query
+    try:
+        limit, offset = parse_search_page(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
     
-    if q:
-        query = query.filter(
-            or_(
-                Doctor.name.ilike(f'%{q}%'),
-                Doctor.specialization.ilike(f'%{q}%')
+    found = search('doctors', q, {'specialization': spec} if spec else None, limit, offset)
+    if found is not None:
+        ids, count, fuzzy = found
+        doctors = load_ranked(with_relations(Doctor.query, Doctor), Doctor, ids)
+    else:
+        # no full-text index on this database
+        query = Doctor.query
+        if q:
+            query = query.filter(
+                or_(
+                    Doctor.name.ilike(f'%{q}%'),
+                    Doctor.specialization.ilike(f'%{q}%')
+                )
             )
-        )
-    
-    if spec:
-        query = query.filter(
-            Doctor.specialization.ilike(f'%{spec}%')
-        )
-    
-    doctors = query.all()
-    data = []
-    
-    for doc in doctors:
-        data.append(doc.to_dict())
+        if spec:
+            query = query.filter(
+                Doctor.specialization.ilike(f'%{spec}%')
+            )
+        count = query.count()
+        doctors = with_relations(query, Doctor).order_by(Doctor.id).offset(offset).limit(limit).all()
+        fuzzy = False
     
-    count = len(data)
+    data = [doc.to_dict() for doc in doctors]
     
-    return jsonify({'success': True, 'message': 'Doctors found', 'data': {'doctors': data, 'count': count}})
+    return jsonify({'success': True, 'message': 'Doctors found', 'data': {'doctors': data, 'count': count, 'fuzzy': fuzzy, **search_page_info(count, limit, offset)}})
 
-# search patients by name or email
+# search patients by name or email, ranked, prefix and typo tolerant (see search.py)
 @admin_bp.route('/search/patients', methods=['GET'])
 @admin_required
 def search_patients():
@@ -271,20 +316,54 @@ def search_patients():
     if not q:
         return jsonify({'success': False, 'message': 'Search query is required', 'errors': ['Missing search parameter']}), 400
     
-    patients = db.session.query(Patient).join(User).filter(
-        or_(
-            Patient.name.ilike(f'%{q}%'),
-            User.email.ilike(f'%{q}%')
+    try:
+        limit, offset = parse_search_page(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
+    
+    found = search('patients', q, None, limit, offset)
+    if found is not None:
+        ids, count, fuzzy = found
+        patients = load_ranked(with_relations(Patient.query, Patient), Patient, ids)
+    else:
+        # no full-text index on this database
+        query = db.session.query(Patient).join(User).filter(
+            or_(
+                Patient.name.ilike(f'%{q}%'),
+                User.email.ilike(f'%{q}%')
+            )
         )
-    ).all()
+        count = query.count()
+        patients = with_relations(query, Patient).order_by(Patient.id).offset(offset).limit(limit).all()
+        fuzzy = False
     
-    data = []
-    for p in patients:
-        data.append(p.to_dict())
+    data = [p.to_dict() for p in patients]
+    
+    return jsonify({'success': True, 'message': 'Patients found', 'data': {'patients': data, 'count': count, 'fuzzy': fuzzy, **search_page_info(count, limit, offset)}})
+
+# typeahead suggestions for the admin search box: doctors, specializations and patients (in-memory index)
+# ?types= narrows the kinds, e.g. types=patients
+@admin_bp.route('/autocomplete', methods=['GET'])
+@admin_required
+def autocomplete_search():
+    q = request.args.get('q', '').strip()
+    
+    if not q:
+        return jsonify({'success': False, 'message': 'Search query is required', 'errors': ['Missing search parameter']}), 400
+    
+    kinds = tuple(kind.strip() for kind in request.args.get('types', ','.join(AUTOCOMPLETE_KINDS)).split(',') if kind.strip())
+    invalid = [kind for kind in kinds if kind not in AUTOCOMPLETE_KINDS]
+    if invalid or not kinds:
+        return jsonify({'success': False, 'message': f'types must be among {", ".join(AUTOCOMPLETE_KINDS)}', 'errors': ['Invalid types']}), 400
+    
+    try:
+        limit = parse_autocomplete_limit(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
     
-    count = len(data)
+    suggestions = autocomplete.suggest(q, kinds, limit)
     
-    return jsonify({'success': True, 'message': 'Patients found', 'data': {'patients': data, 'count': count}})
+    return jsonify({'success': True, 'message': 'Suggestions retrieved', 'data': suggestions})
 
 # toggle patient blacklist status
 @admin_bp.route('/patients/<int:patient_id>/blacklist', methods=['PUT'])
@@ -315,7 +394,7 @@ def get_patient_history(patient_id):
     if patient is None:
         return jsonify({'success': False, 'message': 'Patient not found', 'errors': ['Patient not found']}), 404
     
-    appointments = Appointment.query.filter_by(patient_id=patient_id).order_by(Appointment.appointment_date.desc()).all()
+    appointments = with_relations(Appointment.query, Appointment).filter_by(patient_id=patient_id).order_by(Appointment.appointment_date.desc()).all()
     
     data = []
     for apt in appointments:
@@ -333,7 +412,7 @@ def get_doctor_history(doctor_id):
     if doctor is None:
         return jsonify({'success': False, 'message': 'Doctor not found', 'errors': ['Doctor not found']}), 404
     
-    appointments = Appointment.query.filter_by(doctor_id=doctor_id).order_by(Appointment.appointment_date.desc()).all()
+    appointments = with_relations(Appointment.query, Appointment).filter_by(doctor_id=doctor_id).order_by(Appointment.appointment_date.desc()).all()
     
     data = []
     for apt in appointments:
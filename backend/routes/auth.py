@@ -23,6 +23,11 @@ def login():
             if user.is_active:
                 # create jwt token with user id as string and additional claims for role and username
                 additional_claims = {'role': user.role, 'username': user.username}
+                # profile id lets role decorators skip the doctor/patient lookup
+                if user.role == 'doctor' and user.doctor:
+                    additional_claims['profile_id'] = user.doctor.id
+                elif user.role == 'patient' and user.patient:
+                    additional_claims['profile_id'] = user.patient.id
                 token = create_access_token(identity=str(user.id), additional_claims=additional_claims)
                 return jsonify({'success': True, 'message': 'Login successful', 'data': {'user': user.to_dict(), 'token': token}})
             else:
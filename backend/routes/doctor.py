@@ -1,8 +1,18 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from models import User, Doctor, Patient, Appointment, Treatment, DoctorAvailability
-from datetime import datetime, date, time, timedelta
-from decorators import doctor_required, get_current_user_id
+from models import Doctor, Patient, Appointment, Treatment, AvailabilityTemplate
+from datetime import datetime, date, timedelta
+from decorators import doctor_required, get_current_doctor_id
+from slots import slot_cache
+from serializers import get_doctor_profile, invalidate_doctor
+from pagination import list_page, PATIENT_SORT
+from counters import get_counters
+from queries import doctor_appointments_query, patient_history_query
+from availability import parse_availability_rows, upsert_availability, AvailabilityError, parse_template_rows, replace_templates, availability_calendar
+
+# availability window for the schedule view
+DEFAULT_AVAILABILITY_DAYS = 7
+MAX_AVAILABILITY_DAYS = 90
 
 doctor_bp = Blueprint('doctor', __name__)
 
@@ -10,47 +20,37 @@ doctor_bp = Blueprint('doctor', __name__)
 @doctor_bp.route('/dashboard', methods=['GET'])
 @doctor_required
 def get_dashboard():
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor_id = get_current_doctor_id()
+    doctor = get_doctor_profile(doctor_id)
     
     if doctor is None:
         return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
     
-    # Get total appointments for this doctor (excluding available slots)
-    total_appointments = Appointment.query.filter(
-        Appointment.doctor_id == doctor.id,
-        Appointment.status.in_(['booked', 'cancelled', 'completed'])
-    ).count()
-
-    total_patients = db.session.query(Appointment.patient_id).filter_by(
-        doctor_id=doctor.id
-    ).distinct().count()
-
-    today_appointments = Appointment.query.filter_by(
-        doctor_id=doctor.id,
-        appointment_date=date.today()
-    ).count()
+    # counters are kept up to date on every appointment write (total excludes open slots)
+    today_key = f'doctor:{doctor_id}:day:{date.today().isoformat()}'
+    values = get_counters(f'doctor:{doctor_id}:appointments', f'doctor:{doctor_id}:patients', today_key)
+    
+    total_appointments = values[f'doctor:{doctor_id}:appointments']
+    total_patients = values[f'doctor:{doctor_id}:patients']
+    today_appointments = values[today_key]
     
-    return jsonify({'success': True, 'message': 'Dashboard data retrieved', 'data': {'doctor': doctor.to_dict(), 'today_appointments': today_appointments, 'total_appointments': total_appointments, 'total_patients': total_patients}})
+    return jsonify({'success': True, 'message': 'Dashboard data retrieved', 'data': {'doctor': doctor, 'today_appointments': today_appointments, 'total_appointments': total_appointments, 'total_patients': total_patients}})
 
 # get patient history with appointments and treatments
 @doctor_bp.route('/patient-history/<int:patient_id>', methods=['GET'])
 @doctor_required
 def get_patient_history_details(patient_id):
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor_id = get_current_doctor_id()
     
-    if doctor is None:
-        return jsonify({"error": "Doctor not found"}), 404
-    
-    patient = Patient.query.get(patient_id)
+    # only patients who have an appointment with this doctor
+    patient = Patient.query.filter(
+        Patient.id == patient_id, Patient.appointments.any(Appointment.doctor_id == doctor_id)
+    ).first()
     
     if patient is None:
         return jsonify({"error": "Patient not found"}), 404
     
-    appointments = Appointment.query.filter_by(
-        patient_id=patient_id
-    ).filter(Appointment.status.in_(['booked', 'completed', 'cancelled', 'canceled'])).order_by(Appointment.appointment_date.desc()).all()
+    appointments = patient_history_query(patient_id).all()
     
     history = []
     for apt in appointments:
@@ -104,42 +104,15 @@ def get_patient_history_details(patient_id):
 @doctor_bp.route('/appointments', methods=['GET'])
 @doctor_required
 def get_appointments():
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
+    doctor_id = get_current_doctor_id()
     
     date_filter = request.args.get('date')
     status_filter = request.args.get('status')
     time_filter = request.args.get('time_filter')
     
-    query = Appointment.query.filter_by(doctor_id=doctor.id)
-    query = query.filter(Appointment.status.in_(['booked', 'canceled', 'cancelled', 'completed']))
-    
-    if time_filter == 'today':
-        query = query.filter_by(appointment_date=date.today())
-    elif time_filter == 'upcoming':
-        query = query.filter(Appointment.appointment_date >= date.today())
-        query = query.filter(Appointment.status.in_(['booked']))
-    elif time_filter == 'completed':
-        query = query.filter(Appointment.status == 'completed')
-    else:
-        from datetime import timedelta
-        thirty_days_ago = date.today() - timedelta(days=30)
-        query = query.filter(Appointment.appointment_date >= thirty_days_ago)
-    
-    if date_filter:
-        filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-        query = query.filter_by(appointment_date=filter_date)
-    
-    if status_filter:
-        query = query.filter_by(status=status_filter)
-    
-    appointments = query.order_by(
-        Appointment.appointment_date.asc(),
-        Appointment.appointment_time.asc()
-    ).all()
+    filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date() if date_filter else None
+    
+    appointments = doctor_appointments_query(doctor_id, time_filter, filter_date, status_filter).all()
     
     data = []
     for apt in appointments:
@@ -151,33 +124,26 @@ def get_appointments():
 @doctor_bp.route('/patients', methods=['GET'])
 @doctor_required
 def get_patients():
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
+    doctor_id = get_current_doctor_id()
     
-    patients = db.session.query(Patient).join(Appointment).filter(
-        Appointment.doctor_id == doctor.id
-    ).distinct().all()
+    query = db.session.query(Patient).join(Appointment).filter(
+        Appointment.doctor_id == doctor_id
+    ).distinct()
     
-    data = []
-    for p in patients:
-        data.append(p.to_dict())
+    try:
+        data, page = list_page(query, Patient, PATIENT_SORT, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
     
-    return jsonify({'success': True, 'message': 'Patients retrieved successfully', 'data': {'patients': data}})
+    return jsonify({'success': True, 'message': 'Patients retrieved successfully', 'data': {'patients': data, **page}})
 
 # update appointment status (complete, cancel, etc)
 @doctor_bp.route('/appointments/<int:appointment_id>/status', methods=['PUT'])
 @doctor_required
 def update_appointment_status(appointment_id):
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor_id = get_current_doctor_id()
     
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
-    
-    appointment = Appointment.query.filter_by(id=appointment_id, doctor_id=doctor.id).first()
+    appointment = Appointment.query.filter_by(id=appointment_id, doctor_id=doctor_id).first()
     
     if appointment is None:
         return jsonify({'success': False, 'message': 'Appointment not found', 'errors': ['Appointment not found']}), 404
@@ -197,17 +163,15 @@ def update_appointment_status(appointment_id):
     
     db.session.commit()
     
+    slot_cache.mark(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, booked=(status == 'booked'))
+    
     return jsonify({'success': True, 'message': f'Appointment marked as {status}', 'data': {'appointment': appointment.to_dict()}})
 
 # add treatment details for an appointment
 @doctor_bp.route('/patient-history', methods=['POST'])
 @doctor_required
 def add_patient_history():
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
+    doctor_id = get_current_doctor_id()
     
     data = request.get_json()
     apt_id = data.get('appointment_id')
@@ -217,7 +181,7 @@ def add_patient_history():
     
     appointment = Appointment.query.filter_by(
         id=apt_id,
-        doctor_id=doctor.id
+        doctor_id=doctor_id
     ).first()
     
     if appointment is None:
@@ -239,103 +203,105 @@ def add_patient_history():
     
     db.session.commit()
     
+    slot_cache.mark(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, booked=False)
+    
     return jsonify({'success': True, 'message': 'Patient history updated successfully', 'data': {'treatment': treatment.to_dict(), 'appointment': appointment.to_dict()}})
 
-# get doctor's 7-day availability schedule
+# get doctor's availability schedule, next 7 days by default
+# ?start=YYYY-MM-DD and ?days=N (up to 90) select a longer planning window
 @doctor_bp.route('/availability', methods=['GET'])
 @doctor_required
 def get_availability():
-    from datetime import date, timedelta
+    doctor_id = get_current_doctor_id()
     
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
+    try:
+        start_str = request.args.get('start')
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else date.today()
+        days = int(request.args.get('days', DEFAULT_AVAILABILITY_DAYS))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid start or days', 'errors': ['Use start=YYYY-MM-DD and a numeric days']}), 400
     
-    # next 7 days
-    today = date.today()
-    availability_days = []
-    day_names = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+    if days < 1 or days > MAX_AVAILABILITY_DAYS:
+        return jsonify({'success': False, 'message': f'days must be between 1 and {MAX_AVAILABILITY_DAYS}', 'errors': ['Invalid days']}), 400
     
-    for i in range(7):
-        current_date = today + timedelta(days=i)
-        day_name = day_names[current_date.weekday()] + ', ' + current_date.strftime('%b %d')
-        
-        # check availability for this date
-        morning_avail = DoctorAvailability.query.filter_by(
-            doctor_id=doctor.id,
-            availability_date=current_date,
-            slot_type='morning'
-        ).first()
+    availability_days = availability_calendar(doctor_id, start_date, start_date + timedelta(days=days - 1))
+    
+    return jsonify({'success': True, 'message': 'Availability retrieved successfully', 'data': {'availability': availability_days}})
+
+# get doctor's weekly availability template
+@doctor_bp.route('/availability-templates', methods=['GET'])
+@doctor_required
+def get_availability_templates():
+    templates = AvailabilityTemplate.query.filter_by(doctor_id=get_current_doctor_id()).order_by(
+        AvailabilityTemplate.weekday,
+        AvailabilityTemplate.slot_type.desc()
+    ).all()
+    
+    return jsonify({'success': True, 'message': 'Availability templates retrieved successfully', 'data': {'templates': [t.to_dict() for t in templates]}})
+
+# replace doctor's weekly availability template, e.g. monday-friday mornings
+# dates set through /set-slots stay as exceptions on top of it
+@doctor_bp.route('/availability-templates', methods=['PUT'])
+@doctor_required
+def set_availability_templates():
+    doctor_id = get_current_doctor_id()
+    
+    data = request.get_json() or {}
+    templates = data.get('templates')
+    
+    if not isinstance(templates, list):
+        return jsonify({'success': False, 'message': 'No templates provided', 'errors': ['templates must be a list']}), 400
+    
+    try:
+        rows = parse_template_rows(templates)
+    except AvailabilityError as e:
+        return jsonify({'success': False, 'message': 'Invalid availability templates', 'errors': e.errors}), 400
+    
+    try:
+        replace_templates(doctor_id, rows)
+        db.session.commit()
+        slot_cache.invalidate_doctor(doctor_id)
         
-        evening_avail = DoctorAvailability.query.filter_by(
-            doctor_id=doctor.id,
-            availability_date=current_date,
-            slot_type='evening'
-        ).first()
+        saved = AvailabilityTemplate.query.filter_by(doctor_id=doctor_id).order_by(
+            AvailabilityTemplate.weekday,
+            AvailabilityTemplate.slot_type.desc()
+        ).all()
         
-        availability_days.append({
-            'date': current_date.isoformat(),
-            'day_name': day_name,
-            'morning_available': morning_avail.is_available if morning_avail else False,
-            'evening_available': evening_avail.is_available if evening_avail else False
-        })
+        return jsonify({'success': True, 'message': f'Availability template saved ({len(saved)} sessions)', 'data': {'templates': [t.to_dict() for t in saved]}})
     
-    return jsonify({'success': True, 'message': 'Availability retrieved successfully', 'data': {'availability': availability_days}})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error updating availability templates: {str(e)}'}), 500
 
 # set doctor availability for specific date/slot combinations
+# these rows are exceptions that override the weekly template for that date
 @doctor_bp.route('/set-slots', methods=['POST'])
 @doctor_required
 def set_availability_slots():
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor_id = get_current_doctor_id()
     
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found'}), 404
-    
-    data = request.get_json()
+    data = request.get_json() or {}
     slots = data.get('slots', [])
     
-    if not slots:
+    if not slots or not isinstance(slots, list):
         return jsonify({'success': False, 'message': 'No slots provided'}), 400
     
     try:
-        updated_count = 0
-        created_count = 0
+        rows = parse_availability_rows(slots)
+    except AvailabilityError as e:
+        return jsonify({'success': False, 'message': 'Invalid availability slots', 'errors': e.errors}), 400
+    
+    try:
+        results = upsert_availability(doctor_id, rows)
+        db.session.commit()
         
-        for slot_data in slots:
-            date_str = slot_data.get('date')
-            slot_type = slot_data.get('slot_type')
-            is_available = slot_data.get('is_available', False)
-            
-            # parse date
-            availability_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            # find or create record
-            availability = DoctorAvailability.query.filter_by(
-                doctor_id=doctor.id,
-                availability_date=availability_date,
-                slot_type=slot_type
-            ).first()
-            
-            if availability:
-                # update existing
-                availability.is_available = is_available
-                updated_count += 1
-            else:
-                # create new
-                availability = DoctorAvailability(
-                    doctor_id=doctor.id,
-                    availability_date=availability_date,
-                    slot_type=slot_type,
-                    is_available=is_available
-                )
-                db.session.add(availability)
-                created_count += 1
+        for changed_date in set(day for day, _, _ in rows):
+            slot_cache.invalidate(doctor_id, changed_date)
         
-        db.session.commit()
+        created_count = sum(1 for r in results if r['status'] == 'created')
+        updated_count = len(results) - created_count
         
-        return jsonify({'success': True, 'message': f'Availability updated successfully ({created_count} created, {updated_count} updated)'})
+        return jsonify({'success': True, 'message': f'Availability updated successfully ({created_count} created, {updated_count} updated)', 'data': {'created': created_count, 'updated': updated_count, 'results': results}})
     
     except Exception as e:
         db.session.rollback()
@@ -346,8 +312,7 @@ def set_availability_slots():
 @doctor_required
 def update_doctor_profile():
     try:
-        user_id = get_current_user_id()
-        doctor = Doctor.query.filter_by(user_id=user_id).first()
+        doctor = Doctor.query.get(get_current_doctor_id())
         
         if not doctor:
             return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
@@ -375,6 +340,7 @@ def update_doctor_profile():
             doctor.user.email = data['email']
         
         db.session.commit()
+        invalidate_doctor(doctor.id)
         
         return jsonify({'success': True, 'message': 'Profile updated successfully', 'data': {'doctor': doctor.to_dict()}})
         
@@ -386,16 +352,12 @@ def update_doctor_profile():
 @doctor_bp.route('/available-slots', methods=['GET'])
 @doctor_required
 def get_available_slots():
-    user_id = get_current_user_id()
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    
-    if doctor is None:
-        return jsonify({'success': False, 'message': 'Doctor profile not found', 'errors': ['Profile not found']}), 404
+    doctor_id = get_current_doctor_id()
     
     try:
         from datetime import date
         slots = Appointment.query.filter_by(
-            doctor_id=doctor.id,
+            doctor_id=doctor_id,
             status='available'
         ).filter(Appointment.appointment_date >= date.today()).order_by(
             Appointment.appointment_date.asc(),
@@ -1,8 +1,28 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, send_from_directory
 from database import db
-from models import User, Patient, Doctor, Appointment, Treatment, DoctorAvailability
-from datetime import datetime, date, time, timedelta
-from decorators import patient_required, patient_or_admin_required, get_current_user_id
+from models import User, Patient, Doctor, Appointment, Treatment
+from datetime import datetime, date, timedelta
+import hashlib
+import json
+import os
+from decorators import patient_required, patient_or_admin_required, get_current_patient_id
+from slots import build_slot_grid, is_session_available, slot_cache, get_local_now, get_slot_type
+from availability import availability_entries
+from serializers import with_relations, get_doctor_profile
+from cache import cache
+from pagination import list_page, APPOINTMENT_SORT
+from booking import reserve_slot, SlotConflict
+from counters import get_counters, get_patient_upcoming
+from queries import active_doctors_query, patient_appointments_query
+from outbox import enqueue_appointment_notifications
+from autocomplete import autocomplete, parse_autocomplete_limit
+
+# limits for the multi-doctor slot grid
+MAX_GRID_DOCTORS = 50
+MAX_GRID_DAYS = 31
+
+# days of availability listed on a doctor's availability page
+AVAILABILITY_DAYS = 28
 
 patient_bp = Blueprint('patient', __name__)
 
@@ -10,23 +30,17 @@ patient_bp = Blueprint('patient', __name__)
 @patient_bp.route('/dashboard', methods=['GET'])
 @patient_required
 def get_dashboard():
-    user_id = get_current_user_id()
-    patient = Patient.query.filter_by(user_id=user_id).first()
+    patient = Patient.query.get(get_current_patient_id())
     
     if patient is None:
         return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
     
-    upcoming = Appointment.query.filter(
-        Appointment.patient_id == patient.id,
-        Appointment.appointment_date >= date.today(),
-        Appointment.status == 'booked'
-    ).count()
-    
-    total = Appointment.query.filter_by(patient_id=patient.id).count()
+    # counters are kept up to date on every appointment write
+    upcoming = get_patient_upcoming(patient.id, date.today())
     
-    doctors = db.session.query(Appointment.doctor_id).filter_by(
-        patient_id=patient.id
-    ).distinct().count()
+    values = get_counters(f'patient:{patient.id}:appointments', f'patient:{patient.id}:doctors')
+    total = values[f'patient:{patient.id}:appointments']
+    doctors = values[f'patient:{patient.id}:doctors']
     
     return jsonify({'success': True, 'message': 'Dashboard data retrieved', 'data': {'patient': patient.to_dict(), 'upcoming_appointments': upcoming, 'total_appointments': total, 'doctors_visited': doctors}})
 
@@ -34,47 +48,52 @@ def get_dashboard():
 @patient_bp.route('/departments', methods=['GET'])
 @patient_or_admin_required
 def get_departments():
-    # get unique specializations from active doctors
-    from sqlalchemy import func
+    # prebuilt body from the shared cache, dropped only when a doctor changes (invalidate_doctor)
+    cached = cache.get_or_set('departments:body', _build_departments_body, ttl=3600, tags=('doctors',))
     
-    specializations = db.session.query(
-        Doctor.specialization,
-        func.count(Doctor.id).label('doctor_count')
-    ).filter_by(is_active=True).group_by(Doctor.specialization).all()
+    if request.if_none_match.contains(cached['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(cached['body'], mimetype='application/json')
+    response.set_etag(cached['etag'])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# build the departments response body in one joined query, with a strong etag of its bytes
+def _build_departments_body():
+    rows = db.session.query(
+        Doctor.id, Doctor.name, Doctor.specialization, Doctor.qualification,
+        Doctor.experience, Doctor.consultation_fee, Doctor.phone, User.email
+    ).outerjoin(User, Doctor.user_id == User.id).filter(
+        Doctor.is_active == True
+    ).order_by(Doctor.specialization, Doctor.id).all()
     
     data = []
-    
-    for spec, count in specializations:
-        # get doctors with this specialization
-        doctors = Doctor.query.filter_by(
-            specialization=spec,
-            is_active=True
-        ).all()
-        
-        docs = []
-        for doc in doctors:
-            info = {
-                'id': doc.id,
-                'name': doc.name,
-                'department': spec,
-                'qualification': doc.qualification,
-                'experience': doc.experience,
-                'consultation_fee': doc.consultation_fee,
-                'phone': doc.phone,
-                'email': doc.user.email if doc.user else 'N/A'
-            }
-            docs.append(info)
-        
-        dept_info = {
-            'id': spec.lower().replace(' ', '_'),
-            'name': spec,
-            'description': f'{spec} Department',
-            'doctor_count': count,
-            'doctors': docs
-        }
-        data.append(dept_info)
-    
-    return jsonify({'success': True, 'message': 'Departments retrieved successfully', 'data': {'departments': data}})
+    for row in rows:
+        if not data or data[-1]['name'] != row.specialization:
+            spec = row.specialization
+            data.append({
+                'id': spec.lower().replace(' ', '_'),
+                'name': spec,
+                'description': f'{spec} Department',
+                'doctor_count': 0,
+                'doctors': []
+            })
+        dept_info = data[-1]
+        dept_info['doctor_count'] += 1
+        dept_info['doctors'].append({
+            'id': row.id,
+            'name': row.name,
+            'department': row.specialization,
+            'qualification': row.qualification,
+            'experience': row.experience,
+            'consultation_fee': row.consultation_fee,
+            'phone': row.phone,
+            'email': row.email or 'N/A'
+        })
+    
+    body = json.dumps({'success': True, 'message': 'Departments retrieved successfully', 'data': {'departments': data}})
+    return {'body': body, 'etag': hashlib.sha256(body.encode()).hexdigest()}
 
 # get available slots for doctor on specific date
 @patient_bp.route('/available-slots', methods=['GET'])
@@ -94,71 +113,56 @@ def get_available_slots():
     except ValueError:
         return jsonify({'success': False, 'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    # get current date and time (adjusted for IST - UTC+5:30)
-    # This ensures that checks for "today" and current hour are accurate for the target user base
-    now = datetime.utcnow() + timedelta(hours=5, minutes=30)
-    current_date = now.date()
-    current_hour = now.hour
-    
-    # check if requested date is today
-    is_today = (apt_date == current_date)
-    
-    # check doctor availability for this date
-    morning_avail = DoctorAvailability.query.filter_by(
-        doctor_id=doctor_id,
-        availability_date=apt_date,
-        slot_type='morning',
-        is_available=True
-    ).first()
+    try:
+        doctor_id_int = int(doctor_id)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid doctor ID'}), 400
     
-    evening_avail = DoctorAvailability.query.filter_by(
-        doctor_id=doctor_id,
-        availability_date=apt_date,
-        slot_type='evening',
-        is_available=True
-    ).first()
+    grid = build_slot_grid([doctor_id_int], apt_date, apt_date)
     
-    slots = []
+    # hide slots that have already started (today) or passed
+    slots = [slot for slot in grid[(doctor_id_int, apt_date)] if slot['status'] != 'passed']
     
-    def add_hourly_slots(start_hour, end_hour, slot_type):
-        for h in range(start_hour, end_hour):
-            slot_time = time(h, 0)
-            
-            # Check if this specific hour is booked
-            booked = Appointment.query.filter_by(
-                doctor_id=doctor_id,
-                appointment_date=apt_date,
-                appointment_time=slot_time,
-                status='booked'
-            ).first()
-            
-            # Check if passed (if today)
-            # If current_hour is 9, the 9:00-10:00 slot is considered started/passed
-            is_passed = is_today and current_hour >= h
-            
-            if not is_passed:
-                # Format time for display (12-hour format)
-                start_time_obj = datetime.strptime(f'{h}:00', '%H:%M')
-                end_time_obj = datetime.strptime(f'{h+1}:00', '%H:%M')
-                display_time = f"{start_time_obj.strftime('%I:%M %p')} - {end_time_obj.strftime('%I:%M %p')}"
-                
-                slots.append({
-                    'slot_type': slot_type,
-                    'time': f'{h:02d}:00-{h+1:02d}:00',
-                    'display': display_time,
-                    'status': 'booked' if booked else 'available',
-                    'appointment_time': f'{h:02d}:00'
-                })
+    return jsonify({'success': True, 'message': 'Available slots retrieved successfully', 'data': {'slots': slots, 'date': apt_date.isoformat(), 'doctor_id': doctor_id}})
 
-    # morning slots (9:00-13:00) -> 9, 10, 11, 12
-    if morning_avail:
-        add_hourly_slots(9, 13, 'morning')
+# get hourly slot grid for several doctors over a date range
+@patient_bp.route('/slot-grid', methods=['GET'])
+@patient_or_admin_required
+def get_slot_grid():
+    ids_str = request.args.get('doctor_ids', '')
+    start_str = request.args.get('start_date')
+    end_str = request.args.get('end_date') or start_str
     
-    # evening slots (15:00-19:00) -> 15, 16, 17, 18
-    if evening_avail:
-        add_hourly_slots(15, 19, 'evening')
+    if not ids_str:
+        return jsonify({'success': False, 'message': 'Doctor IDs are required'}), 400
     
-    return jsonify({'success': True, 'message': 'Available slots retrieved successfully', 'data': {'slots': slots, 'date': apt_date.isoformat(), 'doctor_id': doctor_id}})
+    if not start_str:
+        return jsonify({'success': False, 'message': 'Start date is required'}), 400
+    
+    try:
+        doctor_ids = [int(i) for i in ids_str.split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid doctor IDs. Use comma separated numbers'}), 400
+    
+    try:
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'success': False, 'message': 'End date must not be before start date'}), 400
+    
+    if len(doctor_ids) > MAX_GRID_DOCTORS or (end_date - start_date).days + 1 > MAX_GRID_DAYS:
+        return jsonify({'success': False, 'message': f'Slot grid is limited to {MAX_GRID_DOCTORS} doctors and {MAX_GRID_DAYS} days'}), 400
+    
+    grid = build_slot_grid(doctor_ids, start_date, end_date)
+    
+    data = []
+    for (doc_id, day), slots in sorted(grid.items()):
+        data.append({'doctor_id': doc_id, 'date': day.isoformat(), 'slots': slots})
+    
+    return jsonify({'success': True, 'message': 'Slot grid retrieved successfully', 'data': {'grid': data, 'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}})
 
 # get doctors list by department
 @patient_bp.route('/doctors', methods=['GET'])
@@ -167,49 +171,53 @@ def get_doctors():
     try:
         dept = request.args.get('department')
         
-        query = Doctor.query.filter_by(is_active=True)
-        
-        if dept:
-            # filter by specialization
-            query = query.filter(Doctor.specialization == dept)
-        
-        doctors = query.all()
+        doctors = active_doctors_query(dept).all()
         
         return jsonify({'success': True, 'message': 'Doctors retrieved successfully', 'data': {'doctors': [doc.to_dict() for doc in doctors]}})
         
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to get doctors', 'errors': [str(e)]}), 500
 
+# typeahead suggestions for the booking flow: active doctor names and specializations (in-memory index)
+@patient_bp.route('/autocomplete', methods=['GET'])
+@patient_required
+def autocomplete_doctors():
+    q = request.args.get('q', '').strip()
+    
+    if not q:
+        return jsonify({'success': False, 'message': 'Search query is required', 'errors': ['Missing search parameter']}), 400
+    
+    try:
+        limit = parse_autocomplete_limit(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
+    
+    suggestions = autocomplete.suggest(q, ('doctors', 'specializations'), limit)
+    
+    return jsonify({'success': True, 'message': 'Suggestions retrieved', 'data': suggestions})
+
 # get patient's appointments
 @patient_bp.route('/appointments', methods=['GET'])
 @patient_required
 def get_appointments():
-    user_id = get_current_user_id()
-    patient = Patient.query.filter_by(user_id=user_id).first()
-    
-    if patient is None:
-        return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
+    patient_id = get_current_patient_id()
     
     status = request.args.get('status')
     
-    query = Appointment.query.filter_by(patient_id=patient.id)
-    
-    if status:
-        query = query.filter_by(status=status)
+    query = patient_appointments_query(patient_id, status)
     
-    appointments = query.order_by(
-        Appointment.appointment_date.desc(),
-        Appointment.appointment_time.desc()
-    ).all()
+    try:
+        data, page = list_page(query, Appointment, APPOINTMENT_SORT, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': [str(e)]}), 400
     
-    return jsonify({'success': True, 'message': 'Appointments retrieved successfully', 'data': {'appointments': [apt.to_dict() for apt in appointments]}})
+    return jsonify({'success': True, 'message': 'Appointments retrieved successfully', 'data': {'appointments': data, **page}})
 
 # book new appointment
 @patient_bp.route('/appointments', methods=['POST'])
 @patient_required
 def book_appointment():
-    user_id = get_current_user_id()
-    patient = Patient.query.filter_by(user_id=user_id).first()
+    patient = Patient.query.get(get_current_patient_id())
     
     if patient is None:
         return jsonify({'success': False, 'message': 'Patient profile not found'}), 404
@@ -237,12 +245,9 @@ def book_appointment():
     except ValueError:
         return jsonify({'success': False, 'message': 'Invalid date format'}), 400
     
-    # validate date is not in the past
-    # Use IST adjusted time
-    now = datetime.utcnow() + timedelta(hours=5, minutes=30)
+    # validate date is not in the past (hospital local time)
+    now = get_local_now()
     today = now.date()
-    current_hour = now.hour
-    current_minute = now.minute
     
     if apt_date < today:
         return jsonify({'success': False, 'message': 'Cannot book appointments for past dates'}), 400
@@ -257,40 +262,19 @@ def book_appointment():
     
     # determine slot type and validate hour
     hour = apt_time.hour
-    if 9 <= hour < 13:
-        slot_type = 'morning'
-    elif 15 <= hour < 19:
-        slot_type = 'evening'
-    else:
+    slot_type = get_slot_type(hour)
+    if slot_type is None:
         return jsonify({'success': False, 'message': 'Invalid time slot. Only Morning (09:00-13:00) and Evening (15:00-19:00) slots are available.'}), 400
     
     # if booking for today, check if the slot time has already passed
     if apt_date == today:
-        if current_hour >= hour:
-            return jsonify({'success': False, 'message': f'Cannot book this slot for today as it has already passed'}), 400
-    
-    # check if doctor has set this slot as available
-    availability = DoctorAvailability.query.filter_by(
-        doctor_id=data['doctor_id'],
-        availability_date=apt_date,
-        slot_type=slot_type,
-        is_available=True
-    ).first()
+        if now.hour >= hour:
+            return jsonify({'success': False, 'message': 'Cannot book this slot for today as it has already passed'}), 400
     
-    if not availability:
+    # check if doctor has set this slot as available (served from slot cache)
+    if not is_session_available(doctor.id, apt_date, hour):
         return jsonify({'success': False, 'message': f'Doctor is not available for {slot_type} slot on {apt_date}'}), 400
     
-    # check if slot already booked
-    existing_booking = Appointment.query.filter_by(
-        doctor_id=data['doctor_id'],
-        appointment_date=apt_date,
-        appointment_time=apt_time,
-        status='booked'
-    ).first()
-    
-    if existing_booking:
-        return jsonify({'success': False, 'message': 'This slot is already booked'}), 400
-    
     # check if patient already has appointment at this time
     patient_conflict = Appointment.query.filter_by(
         patient_id=patient.id,
@@ -302,18 +286,13 @@ def book_appointment():
     if patient_conflict:
         return jsonify({'success': False, 'message': 'You already have an appointment at this time'}), 400
     
-    # create new appointment
-    appointment = Appointment(
-        doctor_id=data['doctor_id'],
-        patient_id=patient.id,
-        appointment_date=apt_date,
-        appointment_time=apt_time,
-        status='booked',
-        notes=data.get('notes', '')
-    )
+    # insert or take over the slot row atomically, a lost race becomes 409
+    try:
+        appointment = reserve_slot(doctor.id, patient.id, apt_date, apt_time, data.get('notes', ''))
+    except SlotConflict as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
     
-    db.session.add(appointment)
-    db.session.commit()
+    slot_cache.mark(appointment.doctor_id, apt_date, apt_time, booked=True)
     
     return jsonify({'success': True, 'message': 'Appointment booked successfully', 'data': {'appointment': appointment.to_dict()}})
 
@@ -321,15 +300,11 @@ def book_appointment():
 @patient_bp.route('/appointments/<int:appointment_id>', methods=['DELETE'])
 @patient_required
 def cancel_appointment(appointment_id):
-    user_id = get_current_user_id()
-    patient = Patient.query.filter_by(user_id=user_id).first()
-    
-    if patient is None:
-        return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
+    patient_id = get_current_patient_id()
     
     appointment = Appointment.query.filter_by(
         id=appointment_id,
-        patient_id=patient.id
+        patient_id=patient_id
     ).first()
     
     if appointment is None:
@@ -341,22 +316,23 @@ def cancel_appointment(appointment_id):
     appointment.status = 'cancelled'
     appointment.updated_at = datetime.utcnow()
     
+    # notifications go out from the outbox only if the cancellation commits
+    enqueue_appointment_notifications(appointment.id, 'cancellation')
+    
     db.session.commit()
     
+    slot_cache.mark(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, booked=False)
+    
     return jsonify({'success': True, 'message': 'Appointment cancelled successfully', 'data': {}})
 
 # get patient medical history with treatments
 @patient_bp.route('/history', methods=['GET'])
 @patient_required
 def get_history():
-    user_id = get_current_user_id()
-    patient = Patient.query.filter_by(user_id=user_id).first()
+    patient_id = get_current_patient_id()
     
-    if patient is None:
-        return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
-    
-    treatments = db.session.query(Treatment).join(Appointment).filter(
-        Appointment.patient_id == patient.id
+    treatments = with_relations(db.session.query(Treatment).join(Appointment), Treatment, 'appointment.doctor').filter(
+        Appointment.patient_id == patient_id
     ).order_by(Treatment.created_at.desc()).all()
     
     # include appointment and doctor info
@@ -364,8 +340,8 @@ def get_history():
     for treatment in treatments:
         treatment_dict = treatment.to_dict()
         
-        # get appointment details
-        appointment = Appointment.query.get(treatment.appointment_id)
+        # get appointment details (eager loaded with its doctor)
+        appointment = treatment.appointment
         if appointment:
             treatment_dict['appointment'] = {
                 'id': appointment.id,
@@ -393,44 +369,104 @@ def get_history():
 @patient_bp.route('/doctor/availability/<int:doctor_id>', methods=['GET'])
 @patient_required
 def get_doctor_availability(doctor_id):
-    doctor = Doctor.query.get(doctor_id)
+    doctor = get_doctor_profile(doctor_id)
     
-    if doctor is None or not doctor.is_active:
+    if doctor is None or not doctor['is_active']:
         return jsonify({'success': False, 'message': 'Doctor not found or inactive', 'errors': ['Invalid doctor']}), 404
     
-    availability = DoctorAvailability.query.filter_by(
-        doctor_id=doctor_id,
-        is_available=True
-    ).all()
+    # open sessions for the coming weeks, expanded from the weekly template and exceptions
+    today = get_local_now().date()
+    availability = availability_entries(doctor_id, today, today + timedelta(days=AVAILABILITY_DAYS - 1))
     
-    return jsonify({'success': True, 'message': 'Doctor availability retrieved successfully', 'data': {'doctor': doctor.to_dict(), 'availability': [avail.to_dict() for avail in availability]}})
+    return jsonify({'success': True, 'message': 'Doctor availability retrieved successfully', 'data': {'doctor': doctor, 'availability': availability}})
 
 # export patient history as csv via email
 @patient_bp.route('/export-history', methods=['POST'])
 @patient_required
 def export_patient_history():
     try:
-        user_id = get_current_user_id()
-        patient = Patient.query.filter_by(user_id=user_id).first()
-        
-        if not patient:
-            return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
+        patient_id = get_current_patient_id()
         
-        from celery_tasks import export_patient_history_csv
-        task = export_patient_history_csv.delay(patient.id)
+        from celery_tasks import patient_history_export
+        from celery_tasks.reports import export_task_id
+        task = patient_history_export.apply_async(args=(patient_id,), task_id=export_task_id(patient_id))
         
-        return jsonify({'success': True, 'message': 'CSV export started. You will be notified when ready.', 'data': {'task_id': task.id}})
+        return jsonify({'success': True, 'message': 'CSV export started. You will be notified when ready.', 'data': {'task_id': task.id, 'status_url': f'/api/patient/export-history/{task.id}'}})
         
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to start CSV export', 'errors': [str(e)]}), 500
 
+# look up an export task of the current patient, returns (result, error response)
+def _get_export_result(task_id):
+    from celery_tasks import celery
+    from celery_tasks.reports import export_task_owner
+    
+    if export_task_owner(task_id) != get_current_patient_id():
+        return None, (jsonify({'success': False, 'message': 'Export not found', 'errors': ['Unknown task id']}), 404)
+    return celery.AsyncResult(task_id), None
+
+# get progress and result of a history export
+@patient_bp.route('/export-history/<task_id>', methods=['GET'])
+@patient_required
+def get_export_status(task_id):
+    result, error = _get_export_result(task_id)
+    if error:
+        return error
+    
+    try:
+        state = result.state
+        info = result.info
+    except Exception as e:
+        return jsonify({'success': False, 'message': 'Export status unavailable', 'errors': [str(e)]}), 503
+    
+    data = {'task_id': task_id, 'state': state}
+    if state == 'PROGRESS' and isinstance(info, dict):
+        data.update(stage=info.get('stage'), rows=info.get('rows'))
+    elif state == 'SUCCESS' and isinstance(info, dict):
+        data.update(
+            rows=info.get('rows'),
+            filename=info.get('filename'),
+            size=info.get('size'),
+            compressed=info.get('compressed'),
+            emailed=info.get('emailed', True),
+            download_url=f'/api/patient/export-history/{task_id}/download'
+        )
+    elif state == 'FAILURE':
+        data['error'] = str(info)
+    
+    return jsonify({'success': True, 'message': 'Export status retrieved', 'data': data})
+
+# download a finished history export (supports range requests)
+@patient_bp.route('/export-history/<task_id>/download', methods=['GET'])
+@patient_required
+def download_export(task_id):
+    from celery_tasks.reports import EXPORTS_DIR
+    
+    result, error = _get_export_result(task_id)
+    if error:
+        return error
+    
+    try:
+        ready = result.state == 'SUCCESS'
+        info = result.info
+    except Exception as e:
+        return jsonify({'success': False, 'message': 'Export status unavailable', 'errors': [str(e)]}), 503
+    
+    if not ready or not isinstance(info, dict):
+        return jsonify({'success': False, 'message': 'Export is not ready yet', 'errors': [f'Task state: {result.state}']}), 409
+    
+    filename = info['filename']
+    if not os.path.isfile(os.path.join(EXPORTS_DIR, filename)):
+        return jsonify({'success': False, 'message': 'Export file has expired, please export again', 'errors': ['File removed']}), 410
+    
+    return send_from_directory(EXPORTS_DIR, filename, as_attachment=True, conditional=True)
+
 # update patient profile information
 @patient_bp.route('/profile', methods=['PUT'])
 @patient_required
 def update_patient_profile():
     try:
-        user_id = get_current_user_id()
-        patient = Patient.query.filter_by(user_id=user_id).first()
+        patient = Patient.query.get(get_current_patient_id())
         
         if not patient:
             return jsonify({'success': False, 'message': 'Patient profile not found', 'errors': ['Profile not found']}), 404
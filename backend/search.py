@@ -0,0 +1,290 @@
+import base64
+import difflib
+import json
+import os
+import re
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from database import db
+from models import Doctor, Patient, User
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# searchable entities: index table, indexed columns (most important first) and their rank weights
+SEARCH_INDEXES = {
+    'doctors': {'table': 'doctor_search', 'columns': ('name', 'specialization'), 'weights': (10.0, 4.0)},
+    'patients': {'table': 'patient_search', 'columns': ('name', 'email'), 'weights': (10.0, 2.0)}
+}
+
+# postgres tsvector weight label per indexed column (ts_rank scores A highest)
+PG_WEIGHT_LABELS = 'AB'
+
+# typo tolerance: used only when the exact/prefix query finds nothing
+SEARCH_FUZZY_CUTOFF = float(os.getenv('SEARCH_FUZZY_CUTOFF', 0.75))
+FUZZY_ALTERNATIVES = 3
+FUZZY_MIN_LENGTH = 3
+
+# per database url: whether the index tables exist (checked once per process)
+_ready = {}
+
+def _tokens(value):
+    return re.findall(r'\w+', (value or '').lower())
+
+# current indexed values, [(id, col1, col2)] for the given ids (all rows when ids is None)
+def _source_rows(connection, kind, ids=None):
+    if kind == 'doctors':
+        stmt = select(Doctor.id, Doctor.name, Doctor.specialization)
+        if ids is not None:
+            stmt = stmt.where(Doctor.id.in_(ids))
+    else:
+        stmt = select(Patient.id, Patient.name, User.email).outerjoin(User, User.id == Patient.user_id)
+        if ids is not None:
+            stmt = stmt.where(Patient.id.in_(ids))
+    return connection.execute(stmt).all()
+
+def search_ready(connection):
+    key = str(connection.engine.url)
+    if key not in _ready:
+        _ready[key] = connection.dialect.name in ('sqlite', 'postgresql') and all(
+            inspect(connection).has_table(spec['table']) for spec in SEARCH_INDEXES.values()
+        )
+    return _ready[key]
+
+# create the index tables if missing and fill new ones from the source tables
+# sqlite: fts5 tables (plus fts5vocab tables for typo suggestions); postgres: weighted tsvector + gin index
+# returns the created table names, [] on dialects without full-text support or sqlite built without fts5
+def ensure_search_index():
+    dialect = db.engine.dialect.name
+    created = []
+    with db.engine.begin() as connection:
+        for kind, spec in SEARCH_INDEXES.items():
+            table = spec['table']
+            if inspect(connection).has_table(table):
+                continue
+            if dialect == 'sqlite':
+                try:
+                    connection.exec_driver_sql(
+                        f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(spec['columns'])}, "
+                        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                    )
+                except OperationalError:
+                    return created
+                connection.exec_driver_sql(f"CREATE VIRTUAL TABLE {table}_terms USING fts5vocab({table}, 'row')")
+            elif dialect == 'postgresql':
+                connection.exec_driver_sql(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)')
+                connection.exec_driver_sql(f'CREATE INDEX ix_{table}_document ON {table} USING gin (document)')
+            else:
+                return created
+            _write(connection, kind, _source_rows(connection, kind))
+            created.append(table)
+    _ready.pop(str(db.engine.url), None)
+    return created
+
+# refill the whole index from the source tables (reconcile after manual edits or bulk loads)
+def rebuild_search_index():
+    ensure_search_index()
+    count = 0
+    with db.engine.begin() as connection:
+        if not search_ready(connection):
+            return 0
+        for kind, spec in SEARCH_INDEXES.items():
+            connection.exec_driver_sql(f"DELETE FROM {spec['table']}")
+            rows = _source_rows(connection, kind)
+            _write(connection, kind, rows)
+            count += len(rows)
+    return count
+
+# replace the index entries of the given rows, drop removed_ids
+def _write(connection, kind, rows, removed_ids=()):
+    spec = SEARCH_INDEXES[kind]
+    table = spec['table']
+    columns = spec['columns']
+    ids = [row[0] for row in rows] + list(removed_ids)
+    if not ids:
+        return
+
+    key = 'rowid' if connection.dialect.name == 'sqlite' else 'id'
+    connection.execute(
+        text(f'DELETE FROM {table} WHERE {key} IN :ids').bindparams(bindparam('ids', expanding=True)),
+        {'ids': ids}
+    )
+    if not rows:
+        return
+
+    values = [
+        {'id': row[0], **{column: ' '.join(_tokens(value)) for column, value in zip(columns, row[1:])}}
+        for row in rows
+    ]
+    if connection.dialect.name == 'sqlite':
+        stmt = f"INSERT INTO {table} (rowid, {', '.join(columns)}) VALUES (:id, {', '.join(':' + c for c in columns)})"
+    else:
+        document = ' || '.join(
+            f"setweight(to_tsvector('simple', :{column}), '{label}')" for column, label in zip(columns, PG_WEIGHT_LABELS)
+        )
+        stmt = f'INSERT INTO {table} (id, document) VALUES (:id, {document})'
+    connection.execute(text(stmt), values)
+
+# full-text match expression; groups are [(column or None, [(token, alternatives)])]
+def _match_expression(dialect, kind, groups):
+    columns = SEARCH_INDEXES[kind]['columns']
+    parts = []
+    for column, terms in groups:
+        if dialect == 'sqlite':
+            words = []
+            for token, alternatives in terms:
+                options = [f'"{word}"*' for word in [token, *alternatives]]
+                words.append(options[0] if len(options) == 1 else f"({' OR '.join(options)})")
+            parts.append(f"{column} : ({' '.join(words)})" if column else ' AND '.join(words))
+        else:
+            label = PG_WEIGHT_LABELS[columns.index(column)] if column else ''
+            for token, alternatives in terms:
+                options = [f'{word}:*{label}' for word in [token, *alternatives]]
+                parts.append(options[0] if len(options) == 1 else f"({' | '.join(options)})")
+    return (' AND ' if dialect == 'sqlite' else ' & ').join(parts)
+
+def _run(connection, kind, expression, limit, offset):
+    spec = SEARCH_INDEXES[kind]
+    table = spec['table']
+    if connection.dialect.name == 'sqlite':
+        weights = ', '.join(str(w) for w in spec['weights'])
+        ids = connection.execute(text(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH :q ORDER BY bm25({table}, {weights}), rowid LIMIT :limit OFFSET :offset'
+        ), {'q': expression, 'limit': limit, 'offset': offset}).scalars().all()
+        total = connection.execute(text(f'SELECT count(*) FROM {table} WHERE {table} MATCH :q'), {'q': expression}).scalar()
+    else:
+        ids = connection.execute(text(
+            f"SELECT id FROM {table}, to_tsquery('simple', :q) query WHERE document @@ query "
+            f'ORDER BY ts_rank(document, query) DESC, id LIMIT :limit OFFSET :offset'
+        ), {'q': expression, 'limit': limit, 'offset': offset}).scalars().all()
+        total = connection.execute(text(
+            f"SELECT count(*) FROM {table} WHERE document @@ to_tsquery('simple', :q)"
+        ), {'q': expression}).scalar()
+    return ids, total
+
+# indexed words close to a token; only words sharing its first letter are compared
+def _close_words(connection, kind, token):
+    table = SEARCH_INDEXES[kind]['table']
+    bounds = {'lo': token[0], 'hi': chr(ord(token[0]) + 1)}
+    if connection.dialect.name == 'sqlite':
+        sql = f'SELECT term FROM {table}_terms WHERE term >= :lo AND term < :hi'
+    else:
+        sql = f"SELECT word FROM ts_stat('SELECT document FROM {table}') WHERE word >= :lo AND word < :hi"
+    words = connection.execute(text(sql), bounds).scalars().all()
+    return [word for word in difflib.get_close_matches(token, words, n=FUZZY_ALTERNATIVES, cutoff=SEARCH_FUZZY_CUTOFF) if word != token]
+
+# ranked full-text search over one entity: every word must match (as a prefix) somewhere in the row,
+# column_filters restrict words to one indexed column, e.g. {'specialization': 'cardio'}
+# when nothing matches, misspelled words are swapped for close indexed words and the search runs once more
+# returns (ids in rank order, total matches, fuzzy) or None when no search index is available
+def search(kind, q='', column_filters=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+    connection = db.session.connection()
+    if not search_ready(connection):
+        return None
+
+    groups = [(None, _tokens(q))] + [(column, _tokens(value)) for column, value in (column_filters or {}).items()]
+    groups = [(column, tokens) for column, tokens in groups if tokens]
+    if not groups:
+        return [], 0, False
+
+    dialect = connection.dialect.name
+    exact = [(column, [(token, []) for token in tokens]) for column, tokens in groups]
+    ids, total = _run(connection, kind, _match_expression(dialect, kind, exact), limit, offset)
+    if total:
+        return ids, total, False
+
+    fuzzy = [
+        (column, [(token, _close_words(connection, kind, token) if len(token) >= FUZZY_MIN_LENGTH else []) for token in tokens])
+        for column, tokens in groups
+    ]
+    if fuzzy == exact:
+        return [], 0, False
+    ids, total = _run(connection, kind, _match_expression(dialect, kind, fuzzy), limit, offset)
+    return ids, total, True
+
+# load search hits keeping their rank order
+def load_ranked(query, model, ids):
+    if not ids:
+        return []
+    by_id = {obj.id: obj for obj in query.filter(model.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
+
+# ?limit= and ?cursor= for ranked results (the cursor carries an offset, ranks have no stable keyset)
+def parse_search_page(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+
+    offset = 0
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())['offset'])
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if offset < 0:
+            raise ValueError('Invalid cursor')
+    return min(limit, MAX_PAGE_SIZE), offset
+
+def search_page_info(total, limit, offset):
+    has_more = offset + limit < total
+    next_cursor = None
+    if has_more:
+        next_cursor = base64.urlsafe_b64encode(json.dumps({'offset': offset + limit}).encode()).decode()
+    return {'has_more': has_more, 'next_cursor': next_cursor, 'limit': limit}
+
+# indexed attributes per model, changes to anything else leave the index alone
+TRACKED = {Doctor: ('name', 'specialization'), Patient: ('name',), User: ('email',)}
+
+def _changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in TRACKED[type(obj)])
+
+# keep the search index in step with ORM writes (doctor/patient create, profile and email updates),
+# inside the same transaction as the flush
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    changed = {'doctors': set(), 'patients': set()}
+    removed = {'doctors': set(), 'patients': set()}
+    users = set()
+
+    for obj in session.new:
+        if isinstance(obj, Doctor):
+            changed['doctors'].add(obj.id)
+        elif isinstance(obj, Patient):
+            changed['patients'].add(obj.id)
+
+    for obj in session.dirty:
+        if type(obj) not in TRACKED or not _changed(obj):
+            continue
+        if isinstance(obj, Doctor):
+            changed['doctors'].add(obj.id)
+        elif isinstance(obj, Patient):
+            changed['patients'].add(obj.id)
+        else:
+            users.add(obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Doctor):
+            removed['doctors'].add(obj.id)
+        elif isinstance(obj, Patient):
+            removed['patients'].add(obj.id)
+
+    if not (users or any(changed.values()) or any(removed.values())):
+        return
+    connection = session.connection()
+    if not search_ready(connection):
+        return
+
+    # a patient's email lives on its user row
+    if users:
+        changed['patients'].update(connection.execute(
+            select(Patient.id).where(Patient.user_id.in_(users))
+        ).scalars())
+
+    for kind in SEARCH_INDEXES:
+        ids = changed[kind] - removed[kind]
+        rows = _source_rows(connection, kind, ids) if ids else []
+        _write(connection, kind, rows, removed[kind])
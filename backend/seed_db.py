@@ -1,8 +1,8 @@
 from app import app
 from database import db
-from models import User, Doctor, Patient, DoctorAvailability, Appointment, Treatment
+from migrations import migrate
+from models import User, Doctor, Patient, DoctorAvailability, AvailabilityTemplate
 from werkzeug.security import generate_password_hash
-from datetime import date, timedelta, time as datetime_time, datetime
 
 # create admin user
 def create_admin_user():
@@ -73,38 +73,28 @@ def create_sample_doctors():
         db.session.commit()
         print("✓ sample doctors created")
 
-# create 7-day availability (morning/evening slots)
+# create weekly availability templates (every day, morning/evening)
+# dates are expanded from the template on read, DoctorAvailability only holds exceptions
 def create_sample_availability():
+    AvailabilityTemplate.query.delete()
     DoctorAvailability.query.delete()
     db.session.commit()
 
     doctors = Doctor.query.all()
-    today = date.today()
 
     for doc in doctors:
-        for i in range(7):
-            current_date = today + timedelta(days=i)
-
-            # morning slot
-            morning = DoctorAvailability(
-                doctor_id=doc.id,
-                availability_date=current_date,
-                slot_type='morning',
-                is_available=True
-            )
-            db.session.add(morning)
-
-            # evening slot
-            evening = DoctorAvailability(
-                doctor_id=doc.id,
-                availability_date=current_date,
-                slot_type='evening',
-                is_available=True
-            )
-            db.session.add(evening)
+        for weekday in range(7):
+            for slot_type in ('morning', 'evening'):
+                template = AvailabilityTemplate(
+                    doctor_id=doc.id,
+                    weekday=weekday,
+                    slot_type=slot_type,
+                    is_available=True
+                )
+                db.session.add(template)
 
     db.session.commit()
-    print("✓ 7-day availability created (8 slots/day)")
+    print("✓ weekly availability templates created (8 slots/day)")
 
 # create sample patients
 def create_sample_patients():
@@ -166,7 +156,7 @@ if __name__ == '__main__':
     print("initializing database...\n")
 
     with app.app_context():
-        db.create_all()
+        migrate()
         print("✓ tables created")
 
         create_admin_user()
@@ -0,0 +1,100 @@
+from sqlalchemy.orm import joinedload, selectinload, configure_mappers
+from models import Appointment, Doctor, Patient, Treatment
+from cache import cache
+
+# relations each model's to_dict() reads, loaded up front instead of lazily per row
+DICT_RELATIONS = {
+    Appointment: ('patient', 'doctor', 'treatments'),
+    Doctor: ('user',),
+    Patient: ('user',),
+    Treatment: ()
+}
+
+# build loader options for dotted relation paths, e.g. 'appointment.doctor'
+# many-to-one relations are joined, collections use one extra selectin query
+def load_options(model, *paths):
+    configure_mappers()
+    options = []
+    for path in paths:
+        current = model
+        loader = None
+        for name in path.split('.'):
+            attr = getattr(current, name)
+            prop = attr.property
+            if prop.uselist:
+                loader = selectinload(attr) if loader is None else loader.selectinload(attr)
+            else:
+                loader = joinedload(attr) if loader is None else loader.joinedload(attr)
+            current = prop.mapper.class_
+        options.append(loader)
+    return options
+
+# apply the relations an endpoint needs to a query (defaults to what to_dict reads)
+def with_relations(query, model, *paths):
+    if not paths:
+        paths = DICT_RELATIONS.get(model, ())
+    if not paths:
+        return query
+    return query.options(*load_options(model, *paths))
+
+# output keys that need a relation loaded, used by ?fields= projection
+FIELD_RELATIONS = {
+    Appointment: {
+        'patient_name': 'patient',
+        'patient_phone': 'patient',
+        'patient': 'patient',
+        'doctor_name': 'doctor',
+        'doctor_specialization': 'doctor',
+        'consultation_fee': 'doctor',
+        'doctor': 'doctor',
+        'treatment': 'treatments'
+    },
+    Doctor: {'user': 'user'},
+    Patient: {'user': 'user'}
+}
+
+# parse ?fields=a,b,c into a list, None means all fields
+def parse_fields(raw):
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    return fields or None
+
+# relations needed to serialize the requested fields
+def relations_for(model, fields):
+    if fields is None:
+        return DICT_RELATIONS.get(model, ())
+    mapping = FIELD_RELATIONS.get(model, {})
+    heads = set(f.split('.')[0] for f in fields)
+    return tuple(sorted(set(mapping[f] for f in heads if f in mapping)))
+
+# serialize one row with the same shape as to_dict, trimmed to the requested fields
+# dotted fields pick keys of nested sections: 'user.email' -> {'user': {'email': ...}}
+def serialize(obj, fields=None):
+    if fields is None:
+        return obj.to_dict()
+    data = obj.to_dict(include=relations_for(type(obj), fields))
+    out = {}
+    for field in fields:
+        *parents, key = field.split('.')
+        source, target = data, out
+        for part in parents:
+            source = source.get(part) if isinstance(source, dict) else None
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(part, {})
+        else:
+            if key in source:
+                target[key] = source[key]
+    return out
+
+# Doctor.to_dict() served from the shared cache, None if the doctor does not exist
+def get_doctor_profile(doctor_id):
+    def load():
+        doctor = with_relations(Doctor.query, Doctor).filter_by(id=doctor_id).first()
+        return doctor.to_dict() if doctor else None
+    return cache.get_or_set(f'doctor:{doctor_id}:profile', load, ttl=600, tags=(f'doctor:{doctor_id}',))
+
+# drop cached data derived from a doctor (profile and doctor listings) after it changes
+def invalidate_doctor(doctor_id):
+    cache.invalidate_tags(f'doctor:{doctor_id}', 'doctors')
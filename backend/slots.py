@@ -0,0 +1,233 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from database import db
+from models import Appointment
+from availability import expand_availability
+import os
+
+# hourly slots per session: (first hour, end hour exclusive)
+SLOT_HOURS = {
+    'morning': (9, 13),
+    'evening': (15, 19)
+}
+
+# bit position of every bookable hour, then one availability bit per session
+HOUR_BITS = {}
+for _slot_type, (_start, _end) in SLOT_HOURS.items():
+    for _h in range(_start, _end):
+        HOUR_BITS[_h] = len(HOUR_BITS)
+SESSION_BITS = {slot_type: len(HOUR_BITS) + i for i, slot_type in enumerate(SLOT_HOURS)}
+
+# in-process LRU cache of per (doctor, date) slot bitmaps with ttl
+class SlotCache:
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, doctor_id, day):
+        key = (doctor_id, day)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            mask, expires_at = entry
+            if expires_at <= datetime.utcnow():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return mask
+
+    def set(self, doctor_id, day, mask):
+        key = (doctor_id, day)
+        with self._lock:
+            self._entries[key] = (mask, datetime.utcnow() + timedelta(seconds=self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # flip the booked bit of the hour starting at slot_time in place (write-through), no-op if not cached
+    # or not on the hour (off-hour appointments are not part of the slot grid, see _load_masks)
+    def mark(self, doctor_id, day, slot_time, booked):
+        if slot_time.minute != 0:
+            return
+        bit = HOUR_BITS.get(slot_time.hour)
+        if bit is None:
+            return
+        with self._lock:
+            entry = self._entries.get((doctor_id, day))
+            if entry is None:
+                return
+            mask, expires_at = entry
+            mask = mask | (1 << bit) if booked else mask & ~(1 << bit)
+            self._entries[(doctor_id, day)] = (mask, expires_at)
+
+    def invalidate(self, doctor_id, day):
+        with self._lock:
+            self._entries.pop((doctor_id, day), None)
+
+    # drop every cached day of one doctor (weekly template changed)
+    def invalidate_doctor(self, doctor_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == doctor_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+slot_cache = SlotCache(
+    max_entries=int(os.getenv('SLOT_CACHE_SIZE', 10000)),
+    ttl=int(os.getenv('SLOT_CACHE_TTL', 300))
+)
+
+# current local time (IST - UTC+5:30), used for "today" and passed-slot checks
+def get_local_now():
+    return datetime.utcnow() + timedelta(hours=5, minutes=30)
+
+# map an hour to its session, None if outside working hours
+def get_slot_type(hour):
+    for slot_type, (start, end) in SLOT_HOURS.items():
+        if start <= hour < end:
+            return slot_type
+    return None
+
+def _make_slot(slot_type, h, status):
+    # format time for display (12-hour format)
+    start_time_obj = datetime.strptime(f'{h}:00', '%H:%M')
+    end_time_obj = datetime.strptime(f'{h+1}:00', '%H:%M')
+    display_time = f"{start_time_obj.strftime('%I:%M %p')} - {end_time_obj.strftime('%I:%M %p')}"
+
+    return {
+        'slot_type': slot_type,
+        'time': f'{h:02d}:00-{h+1:02d}:00',
+        'display': display_time,
+        'status': status,
+        'appointment_time': f'{h:02d}:00'
+    }
+
+# (doctor_id, date, time) of the booked appointments of the doctors in a date range
+def booked_slots_query(doctor_ids, start_date, end_date):
+    return db.session.query(
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.appointment_time
+    ).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_date >= start_date,
+        Appointment.appointment_date <= end_date,
+        Appointment.status == 'booked'
+    )
+
+# load slot bitmaps for the given doctors and dates (availability expansion plus one appointment query)
+def _load_masks(doctor_ids, start_date, end_date):
+    masks = {}
+    days = (end_date - start_date).days + 1
+    for doctor_id in doctor_ids:
+        for i in range(days):
+            masks[(doctor_id, start_date + timedelta(days=i))] = 0
+
+    # templates expanded with per-date exceptions applied
+    for key, sessions in expand_availability(doctor_ids, start_date, end_date).items():
+        for slot_type, (is_available, _) in sessions.items():
+            if is_available and slot_type in SESSION_BITS:
+                masks[key] |= 1 << SESSION_BITS[slot_type]
+
+    for doctor_id, day, slot_time in booked_slots_query(doctor_ids, start_date, end_date).all():
+        if slot_time.minute == 0 and slot_time.hour in HOUR_BITS:
+            masks[(doctor_id, day)] |= 1 << HOUR_BITS[slot_time.hour]
+
+    return masks
+
+# get slot bitmaps from cache, loading all misses in one batch
+def get_slot_masks(doctor_ids, start_date, end_date):
+    days = (end_date - start_date).days + 1
+    masks = {}
+    missing = []
+    for doctor_id in doctor_ids:
+        for i in range(days):
+            day = start_date + timedelta(days=i)
+            mask = slot_cache.get(doctor_id, day)
+            if mask is None:
+                missing.append((doctor_id, day))
+            else:
+                masks[(doctor_id, day)] = mask
+
+    if missing:
+        missing_doctors = sorted(set(doctor_id for doctor_id, _ in missing))
+        first_day = min(day for _, day in missing)
+        last_day = max(day for _, day in missing)
+        loaded = _load_masks(missing_doctors, first_day, last_day)
+        for key in missing:
+            masks[key] = loaded[key]
+            slot_cache.set(key[0], key[1], loaded[key])
+
+    return masks
+
+# check whether doctor has published the session that contains this hour
+def is_session_available(doctor_id, day, hour):
+    slot_type = get_slot_type(hour)
+    if slot_type is None:
+        return False
+    mask = get_slot_masks([doctor_id], day, day)[(doctor_id, day)]
+    return bool(mask & (1 << SESSION_BITS[slot_type]))
+
+# build hourly slot grid for many doctors over a date range
+# returns {(doctor_id, date): [slot, ...]}, misses are loaded in one batch (see _load_masks)
+def build_slot_grid(doctor_ids, start_date, end_date, now=None):
+    doctor_ids = sorted(set(doctor_ids))
+    if now is None:
+        now = get_local_now()
+
+    grid = {}
+    if not doctor_ids or end_date < start_date:
+        return grid
+
+    masks = get_slot_masks(doctor_ids, start_date, end_date)
+
+    for (doctor_id, day), mask in sorted(masks.items()):
+        is_today = (day == now.date())
+        is_past_day = day < now.date()
+
+        slots = []
+        for slot_type, (start_hour, end_hour) in SLOT_HOURS.items():
+            if not mask & (1 << SESSION_BITS[slot_type]):
+                continue
+            for h in range(start_hour, end_hour):
+                # if current hour is 9, the 9:00-10:00 slot is considered started/passed
+                if is_past_day or (is_today and now.hour >= h):
+                    status = 'passed'
+                elif mask & (1 << HOUR_BITS[h]):
+                    status = 'booked'
+                else:
+                    status = 'available'
+                slots.append(_make_slot(slot_type, h, status))
+
+        grid[(doctor_id, day)] = slots
+
+    return grid
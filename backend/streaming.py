@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from flask import Response, stream_with_context
+from models import Appointment, Patient
+from serializers import parse_fields, relations_for, serialize, with_relations
+from pagination import sort_order
+
+STREAM_FORMATS = ('ndjson', 'csv')
+
+# rows fetched per round trip while streaming, and rows written per response chunk
+YIELD_PER = 500
+FLUSH_EVERY = 100
+
+# csv columns per model (dotted names read nested to_dict sections)
+CSV_COLUMNS = {
+    Appointment: [
+        'id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'status', 'notes',
+        'created_at', 'updated_at', 'patient_name', 'patient_phone', 'doctor_name',
+        'doctor_specialization', 'consultation_fee', 'treatment.visit_type', 'treatment.diagnosis',
+        'treatment.prescription', 'treatment.treatment_notes'
+    ],
+    Patient: [
+        'id', 'user_id', 'name', 'phone', 'address', 'age', 'gender', 'medical_history',
+        'emergency_contact', 'is_blacklisted', 'created_at', 'user.username', 'user.email', 'user.is_active'
+    ]
+}
+
+def _csv_value(data, column):
+    value = data
+    for part in column.split('.'):
+        if not isinstance(value, dict):
+            return ''
+        value = value.get(part)
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+def _ndjson_rows(rows, fields):
+    buffer = []
+    for obj in rows:
+        buffer.append(json.dumps(serialize(obj, fields)) + '\n')
+        if len(buffer) >= FLUSH_EVERY:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+def _csv_rows(rows, fields, columns):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for obj in rows:
+        data = serialize(obj, fields)
+        writer.writerow([_csv_value(data, column) for column in columns])
+        count += 1
+        if count % FLUSH_EVERY == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate(0)
+    yield out.getvalue()
+
+# stream a list query as ndjson or csv without building the whole list in memory
+# rows keep the to_dict shape (honouring ?fields=), fetched in batches with yield_per
+def stream_list(query, model, sort, args, name):
+    fmt = args.get('format')
+    fields = parse_fields(args.get('fields'))
+    relations = relations_for(model, fields)
+    if relations:
+        query = with_relations(query, model, *relations)
+
+    rows = query.order_by(*sort_order(sort)).yield_per(YIELD_PER)
+
+    if fmt == 'csv':
+        columns = fields if fields is not None else CSV_COLUMNS[model]
+        body = _csv_rows(rows, fields, columns)
+        mimetype = 'text/csv'
+    else:
+        body = _ndjson_rows(rows, fields)
+        mimetype = 'application/x-ndjson'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    return response
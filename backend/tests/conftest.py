@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# throwaway sqlite file, set before app.py reads DATABASE_URL
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+
+# seeded logins (seed_db.py)
+USERS = {
+    'admin': ('admin', 'admin'),
+    'doctor': ('ajay', 'ajay.kumar123'),
+    'patient': ('arjun', 'arjun')
+}
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from database import db
+    from migrations import migrate
+    import seed_db
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        migrate()
+        seed_db.create_admin_user()
+        seed_db.create_sample_doctors()
+        seed_db.create_sample_availability()
+        seed_db.create_sample_patients()
+        db.session.remove()
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+# role -> Authorization header of the seeded user
+@pytest.fixture(scope='session')
+def auth(app):
+    client = app.test_client()
+    headers = {}
+    for role, (username, password) in USERS.items():
+        response = client.post('/api/auth/login', json={'username': username, 'password': password})
+        headers[role] = {'Authorization': 'Bearer ' + response.get_json()['data']['token']}
+    return headers
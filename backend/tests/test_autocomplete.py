@@ -0,0 +1,5 @@
+# the first lookup of a process builds the index instead of answering from an empty one
+def test_first_request_is_answered(client, auth):
+    response = client.get('/api/patient/autocomplete?q=cardio', headers=auth['patient'])
+    assert response.status_code == 200
+    assert response.get_json()['data']['specializations'] == ['Cardiology']
@@ -0,0 +1,88 @@
+from collections import Counter
+from datetime import date, timedelta
+from threading import Barrier, Thread
+import pytest
+from flask_jwt_extended import create_access_token
+from database import db
+from models import Appointment, Doctor, Patient, User
+
+# patients racing for the same slot
+RACERS = 200
+
+# patient id -> Authorization header of RACERS fresh patients (tokens minted directly, no password hashing)
+@pytest.fixture(scope='module')
+def racers(app):
+    headers = {}
+    with app.app_context():
+        for i in range(RACERS):
+            user = User(username=f'racer{i}', email=f'racer{i}@example.com', password_hash='-', role='patient')
+            db.session.add(user)
+            db.session.flush()
+            patient = Patient(user_id=user.id, name=f'Racer {i}')
+            db.session.add(patient)
+            db.session.flush()
+            token = create_access_token(identity=str(user.id), additional_claims={
+                'role': 'patient', 'username': user.username, 'profile_id': patient.id
+            })
+            headers[patient.id] = {'Authorization': 'Bearer ' + token}
+        db.session.commit()
+    return headers
+
+@pytest.fixture(scope='module')
+def slot(app):
+    with app.app_context():
+        doctor_id = Doctor.query.join(User).filter(User.username == 'rajesh').one().id
+    return {'doctor_id': doctor_id, 'appointment_date': (date.today() + timedelta(days=7)).isoformat(), 'appointment_time': '10:00'}
+
+# every racer posts the same booking at once, returns the status codes
+def race(app, racers, slot):
+    barrier = Barrier(len(racers))
+    statuses = []
+
+    def book(headers):
+        client = app.test_client()
+        barrier.wait()
+        statuses.append(client.post('/api/patient/appointments', json=slot, headers=headers).status_code)
+
+    threads = [Thread(target=book, args=(headers,)) for headers in racers.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Counter(statuses)
+
+def slot_rows(app, slot):
+    with app.app_context():
+        return Appointment.query.filter_by(
+            doctor_id=slot['doctor_id'],
+            appointment_date=date.fromisoformat(slot['appointment_date'])
+        ).all()
+
+def test_parallel_bookings_get_one_slot(app, racers, slot):
+    statuses = race(app, racers, slot)
+
+    assert statuses == Counter({200: 1, 409: RACERS - 1})
+    rows = slot_rows(app, slot)
+    assert len(rows) == 1
+    assert rows[0].status == 'booked'
+
+def test_cancelled_slot_is_rebooked_once(app, racers, slot):
+    # the winner of the first race cancels, everyone races for the freed slot again
+    with app.app_context():
+        appointment = Appointment.query.filter_by(
+            doctor_id=slot['doctor_id'],
+            appointment_date=date.fromisoformat(slot['appointment_date']),
+            status='booked'
+        ).one()
+        winner = appointment.patient_id
+    response = app.test_client().delete(f'/api/patient/appointments/{appointment.id}', headers=racers[winner])
+    assert response.status_code == 200
+
+    statuses = race(app, {patient_id: headers for patient_id, headers in racers.items() if patient_id != winner}, slot)
+
+    assert statuses == Counter({200: 1, 409: RACERS - 2})
+    rows = slot_rows(app, slot)
+    # the cancelled row is taken over, not duplicated
+    assert len(rows) == 1
+    assert rows[0].status == 'booked'
+    assert rows[0].patient_id != winner
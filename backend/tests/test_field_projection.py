@@ -0,0 +1,13 @@
+import csv
+import io
+import json
+
+URL = '/api/admin/patients?fields=id,user.email'
+
+def test_dotted_field_in_csv_and_ndjson(client, auth):
+    rows = list(csv.DictReader(io.StringIO(client.get(URL + '&format=csv', headers=auth['admin']).get_data(as_text=True))))
+    lines = [json.loads(line) for line in client.get(URL + '&format=ndjson', headers=auth['admin']).get_data(as_text=True).splitlines()]
+
+    assert rows and all(row['user.email'] for row in rows)
+    assert [row['user.email'] for row in rows] == [line['user']['email'] for line in lines]
+    assert set(lines[0]) == {'id', 'user'}
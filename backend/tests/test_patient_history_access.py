@@ -0,0 +1,20 @@
+from datetime import date, time, timedelta
+from database import db
+from models import Appointment, Doctor, Patient, User
+
+# a doctor sees the history of their own patients only
+def test_doctor_sees_only_own_patients(app, client, auth):
+    with app.app_context():
+        doctor_id = Doctor.query.join(User).filter(User.username == 'ajay').one().id
+        patient_id = Patient.query.join(User).filter(User.username == 'vikram').one().id
+
+    url = f'/api/doctor/patient-history/{patient_id}'
+    assert client.get(url, headers=auth['doctor']).status_code == 404
+
+    with app.app_context():
+        db.session.add(Appointment(
+            doctor_id=doctor_id, patient_id=patient_id, appointment_date=date.today() + timedelta(days=3),
+            appointment_time=time(11), status='booked'
+        ))
+        db.session.commit()
+    assert client.get(url, headers=auth['doctor']).status_code == 200
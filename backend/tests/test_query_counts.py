@@ -0,0 +1,92 @@
+from datetime import date, time, timedelta
+import pytest
+from cache import cache
+from database import db
+from models import Appointment, Doctor, Patient, Treatment, User
+from slots import slot_cache
+
+# statements one request may send; relations are eager-loaded, so this does not grow with the rows listed
+MAX_STATEMENTS = 8
+
+# (role, url) of the dashboard and list endpoints
+ENDPOINTS = [
+    ('admin', '/api/admin/dashboard-stats'),
+    ('admin', '/api/admin/doctors'),
+    ('admin', '/api/admin/patients'),
+    ('admin', '/api/admin/appointments'),
+    ('admin', '/api/admin/appointments?limit=100'),
+    ('admin', '/api/admin/doctors/{doctor_id}/history'),
+    ('admin', '/api/admin/patients/{patient_id}/history'),
+    ('doctor', '/api/doctor/dashboard'),
+    ('doctor', '/api/doctor/appointments'),
+    ('doctor', '/api/doctor/patients'),
+    ('doctor', '/api/doctor/patient-history/{patient_id}'),
+    ('patient', '/api/patient/dashboard'),
+    ('patient', '/api/patient/appointments'),
+    ('patient', '/api/patient/history'),
+    ('patient', '/api/patient/doctors')
+]
+
+HOURS = (9, 10, 11, 12, 15, 16, 17, 18)
+
+# completed visits with a treatment between the seeded doctor and patient, one per past hour slot
+def add_visits(doctor_id, patient_id, count, first_day):
+    for i in range(count):
+        appointment = Appointment(
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+            appointment_date=date.today() - timedelta(days=first_day + i // len(HOURS)),
+            appointment_time=time(HOURS[i % len(HOURS)]),
+            status='completed'
+        )
+        db.session.add(appointment)
+        db.session.flush()
+        db.session.add(Treatment(appointment_id=appointment.id, visit_type='consultation', diagnosis='checkup'))
+    db.session.commit()
+
+# statement count of each endpoint with a few visits, then with many more; caches are emptied
+# before every request so each count is a cold load
+@pytest.fixture(scope='module')
+def statement_counts(app, auth):
+    from sqlalchemy import event
+
+    with app.app_context():
+        doctor_id = Doctor.query.join(User).filter(User.username == 'ajay').one().id
+        patient_id = Patient.query.join(User).filter(User.username == 'arjun').one().id
+        engine = db.engine
+
+    client = app.test_client()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def measure():
+        counts = {}
+        for role, url in ENDPOINTS:
+            cache.local.clear()
+            slot_cache.clear()
+            statements.clear()
+            event.listen(engine, 'before_cursor_execute', record)
+            try:
+                response = client.get(url.format(doctor_id=doctor_id, patient_id=patient_id), headers=auth[role])
+            finally:
+                event.remove(engine, 'before_cursor_execute', record)
+            assert response.status_code == 200, (url, response.get_json())
+            counts[(role, url)] = len(statements)
+        return counts
+
+    with app.app_context():
+        add_visits(doctor_id, patient_id, 3, 1)
+    few = measure()
+    with app.app_context():
+        add_visits(doctor_id, patient_id, 24, 2)
+    many = measure()
+    return few, many
+
+@pytest.mark.parametrize('role,url', ENDPOINTS)
+def test_statement_count_is_bounded(statement_counts, role, url):
+    few, many = statement_counts
+    assert many[(role, url)] <= MAX_STATEMENTS
+    # 8x the rows, no extra statements
+    assert many[(role, url)] <= few[(role, url)]
@@ -0,0 +1,6 @@
+from migrations import check_query_plans
+
+# every hot query must use an index; a new SCAN step has to be fixed or added to QUERY_PLAN_ALLOWLIST
+def test_hot_queries_do_not_scan(app):
+    with app.app_context():
+        assert check_query_plans() == []
@@ -0,0 +1,23 @@
+from datetime import date, time
+from slots import HOUR_BITS, SlotCache
+
+DAY = date(2030, 1, 7)
+
+def test_mark_flips_the_hour_bit():
+    cache = SlotCache()
+    cache.set(1, DAY, 0)
+    cache.mark(1, DAY, time(10), booked=True)
+    assert cache.get(1, DAY) == 1 << HOUR_BITS[10]
+    cache.mark(1, DAY, time(10), booked=False)
+    assert cache.get(1, DAY) == 0
+
+def test_mark_ignores_off_hour_times():
+    cache = SlotCache()
+    booked_ten = 1 << HOUR_BITS[10]
+    cache.set(1, DAY, booked_ten)
+    # a 10:30 booking or cancellation leaves the 10:00 slot alone
+    cache.mark(1, DAY, time(10, 30), booked=False)
+    assert cache.get(1, DAY) == booked_ten
+    cache.set(1, DAY, 0)
+    cache.mark(1, DAY, time(10, 30), booked=True)
+    assert cache.get(1, DAY) == 0